@@ -0,0 +1,424 @@
+"""JSON HTTP API for EchoMind analytics.
+
+Uploads become jobs: parsing and analysis run on a bounded process pool
+while an asyncio (Starlette) front end accepts uploads and serves results,
+so a large chat never blocks other requests.
+
+    POST /jobs?user=Overall&pdf=1    raw export or multipart field "file" -> {"job_id": ...}
+    GET  /jobs/{id}                  status and the sections that are ready
+    GET  /jobs/{id}/sections/{name}  one section (202 while it is still running)
+    GET  /jobs/{id}/stream           NDJSON, one line per section as it completes
+    GET  /jobs/{id}/report.pdf       the PDF report
+    GET  /health                     pool and queue status
+
+Run with ``python api.py --port 8000``.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import queue
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from io import BytesIO
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+import cache
+import helper
+import pdf_utils
+import preprocessor
+
+# Analysis processes, admitted jobs that may be queued or running, finished jobs kept, upload limit
+API_WORKERS = int(os.environ.get('ECHOMIND_API_WORKERS', str(os.cpu_count() or 1)))
+API_MAX_PENDING = int(os.environ.get('ECHOMIND_API_MAX_PENDING', '64'))
+API_MAX_JOBS = int(os.environ.get('ECHOMIND_API_MAX_JOBS', '256'))
+API_MAX_UPLOAD = int(os.environ.get('ECHOMIND_API_MAX_UPLOAD_MB', '200')) * 1024 * 1024
+
+# Seconds a relay thread waits for the next section before checking that the worker is still alive
+RELAY_TIMEOUT = 1.0
+
+
+def _records(df):
+    return json.loads(df.to_json(orient='records', date_format='iso'))
+
+
+def _section_stats(selected_user, df):
+    messages, words, media, links = helper.fetch_stats(selected_user, df)
+    return {'messages': messages, 'words': words, 'media': media, 'links': links}
+
+
+def _section_users(selected_user, df):
+    counts = helper.build_index(df).user_counts
+    percent = (counts / max(counts.sum(), 1) * 100).round(2)
+    return [{'user': str(user), 'percent': float(value)} for user, value in percent.items()]
+
+
+def _section_monthly_timeline(selected_user, df):
+    return _records(helper.monthly_timeline(selected_user, df)[['time', 'message']])
+
+
+def _section_daily_timeline(selected_user, df):
+    return _records(helper.daily_timeline(selected_user, df).rename(columns={'only_date': 'date'}))
+
+
+def _section_weekly_activity(selected_user, df):
+    return {str(day): int(count) for day, count in helper.week_activity_map(selected_user, df).items()}
+
+
+def _section_monthly_activity(selected_user, df):
+    return {str(month): int(count) for month, count in helper.month_activity_map(selected_user, df).items()}
+
+
+def _section_heatmap(selected_user, df):
+    heatmap = helper.activity_heatmap(selected_user, df)
+    return {str(day): {str(period): int(count) for period, count in row.items()}
+            for day, row in heatmap.iterrows()}
+
+
+def _section_words(selected_user, df):
+    return helper.build_index(df).words(selected_user).most_common(20)
+
+
+def _section_emojis(selected_user, df):
+    return helper.build_index(df).emojis(selected_user).most_common()
+
+
+def _section_sentiment(selected_user, df):
+    mean, counts = helper.sentiment_breakdown(selected_user, df)
+    timeline = helper.sentiment_timeline(selected_user, df)[['time', 'sentiment']]
+    return {'mean': round(float(mean), 4), 'labels': {label: int(count) for label, count in counts.items()},
+            'monthly': _records(timeline.round(4))}
+
+
+# JSON sections in the order they are computed; 'pdf' is rendered after them
+SECTIONS = OrderedDict([
+    ('stats', _section_stats),
+    ('users', _section_users),
+    ('monthly_timeline', _section_monthly_timeline),
+    ('daily_timeline', _section_daily_timeline),
+    ('weekly_activity', _section_weekly_activity),
+    ('monthly_activity', _section_monthly_activity),
+    ('heatmap', _section_heatmap),
+    ('words', _section_words),
+    ('emojis', _section_emojis),
+    ('sentiment', _section_sentiment),
+])
+
+
+def _load_chat(data, key):
+    # Reuse the parse when the same worker sees the same upload again
+    df = cache.results.get_or_compute((key, 'preprocess'),
+                                      lambda: preprocessor.preprocess_stream(BytesIO(data)))
+    if df['date'].isnull().all():
+        raise ValueError('no message with a valid date; not a supported chat export')
+    return df
+
+
+def render_report(df, selected_user):
+    """The PDF report of a parsed chat, as bytes."""
+    report = pdf_utils.create_pdf_report(df, selected_user, *helper.fetch_stats(selected_user, df),
+                                         chart_workers=1)
+    return report.getvalue()
+
+
+def analyze_upload(data, key, selected_user, results=None, pdf=False):
+    """Pool task: parse an upload, compute every JSON section and, with ``pdf``, the PDF report.
+
+    Returns ``(sections, report)``, report being None without ``pdf``. The
+    report is rendered last, from the same parsed chat and analytics index
+    as the sections. With a ``results`` queue (a multiprocessing.Manager
+    queue) each section is also put on it as ``(name, value)`` as soon as it
+    is computed, and None once the sections are done or the task fails, so
+    the API can publish sections one by one while the report renders.
+    """
+    sections = {}
+    try:
+        df = _load_chat(data, key)
+        for name, func in SECTIONS.items():
+            sections[name] = func(selected_user, df)
+            if results is not None:
+                results.put((name, sections[name]))
+    finally:
+        if results is not None:
+            results.put(None)
+    return sections, render_report(df, selected_user) if pdf else None
+
+
+class Job:
+    def __init__(self, job_id, selected_user, expected):
+        self.id = job_id
+        self.selected_user = selected_user
+        self.expected = expected
+        self.status = 'queued'
+        self.sections = {}
+        self.pdf = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.changed = asyncio.Condition()
+
+    @property
+    def done(self):
+        return self.status in ('done', 'failed')
+
+    async def publish(self, sections=None, status=None, error=None):
+        async with self.changed:
+            if sections:
+                self.sections.update(sections)
+            if status:
+                self.status = status
+            if error:
+                self.error = error
+            if self.done:
+                self.finished = time.time()
+            self.changed.notify_all()
+
+    def describe(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'user': self.selected_user,
+            'ready': [name for name in self.expected if name in self.sections],
+            'pending': [name for name in self.expected if name not in self.sections],
+            'error': self.error,
+            'created': self.created,
+            'finished': self.finished,
+        }
+
+
+class JobManager:
+    """Admits jobs up to ``max_pending`` at a time and runs them on a process pool."""
+
+    def __init__(self, workers=API_WORKERS, max_pending=API_MAX_PENDING, max_jobs=API_MAX_JOBS):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.pool = None
+        self.manager = None
+        self.relay_threads = None
+        # Strong references so running job tasks are not garbage collected
+        self._tasks = set()
+
+    def start(self):
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        # Carries sections from the workers to the event loop as they are computed
+        self.manager = multiprocessing.Manager()
+        # Each running job waits on its queue in one of these threads, never on the event loop
+        self.relay_threads = ThreadPoolExecutor(max_workers=self.max_pending, thread_name_prefix='relay')
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+        if self.relay_threads is not None:
+            self.relay_threads.shutdown(wait=False, cancel_futures=True)
+            self.relay_threads = None
+        if self.manager is not None:
+            self.manager.shutdown()
+            self.manager = None
+
+    def submit(self, data, selected_user='Overall', pdf=True):
+        """Start a job for an uploaded export, or return None when the queue is full."""
+        if self.pending >= self.max_pending:
+            return None
+        expected = list(SECTIONS) + (['pdf'] if pdf else [])
+        job = Job(uuid.uuid4().hex, selected_user, expected)
+        self.jobs[job.id] = job
+        self._evict()
+        self.pending += 1
+        task = asyncio.get_running_loop().create_task(self._run(job, data, pdf))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def _evict(self):
+        # Drop the oldest finished jobs beyond the retention limit
+        excess = len(self.jobs) - self.max_jobs
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.done][:max(excess, 0)]:
+            del self.jobs[job_id]
+
+    async def _run(self, job, data, pdf):
+        loop = asyncio.get_running_loop()
+        key = cache.content_key(data)
+        await job.publish(status='running')
+        results = self.manager.Queue()
+        analysis = loop.run_in_executor(self.pool, analyze_upload, data, key, job.selected_user, results, pdf)
+        try:
+            try:
+                await self._relay(results, analysis, job)
+                _, report = await analysis
+                if report is not None:
+                    job.pdf = report
+                    await job.publish(sections={'pdf': {'bytes': len(job.pdf), 'url': f'/jobs/{job.id}/report.pdf'}})
+            except Exception as e:
+                await job.publish(status='failed', error=f'{type(e).__name__}: {e}')
+                self.failed += 1
+                return
+            await job.publish(status='done')
+            self.completed += 1
+        finally:
+            self.pending -= 1
+
+    async def _relay(self, results, analysis, job):
+        """Publish the sections the analysis task puts on ``results`` until it is done with them."""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                item = await loop.run_in_executor(self.relay_threads, results.get, True, RELAY_TIMEOUT)
+            except queue.Empty:
+                if analysis.done():
+                    # The worker died before saying it was done; the task result tells why
+                    return
+                continue
+            if item is None:
+                return
+            name, value = item
+            await job.publish(sections={name: value})
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'pending': self.pending,
+            'max_pending': self.max_pending,
+            'jobs': len(self.jobs),
+            'completed': self.completed,
+            'failed': self.failed,
+        }
+
+
+def _job_or_404(request):
+    job = request.app.state.jobs.jobs.get(request.path_params['job_id'])
+    if job is None:
+        return None, JSONResponse({'error': 'unknown job'}, status_code=404)
+    return job, None
+
+
+async def create_job(request):
+    if int(request.headers.get('content-length') or 0) > API_MAX_UPLOAD:
+        return JSONResponse({'error': 'upload too large'}, status_code=413)
+    content_type = request.headers.get('content-type', '')
+    if content_type.startswith('multipart/form-data'):
+        form = await request.form(max_part_size=API_MAX_UPLOAD)
+        upload = form.get('file')
+        if upload is None or isinstance(upload, str):
+            return JSONResponse({'error': 'multipart upload needs a "file" field'}, status_code=400)
+        data = await upload.read()
+    else:
+        data = await request.body()
+    if not data:
+        return JSONResponse({'error': 'empty upload'}, status_code=400)
+    if len(data) > API_MAX_UPLOAD:
+        return JSONResponse({'error': 'upload too large'}, status_code=413)
+
+    pdf = request.query_params.get('pdf', '1').lower() not in ('0', 'false', 'no')
+    job = request.app.state.jobs.submit(data, request.query_params.get('user', 'Overall'), pdf)
+    if job is None:
+        return JSONResponse({'error': 'too many pending jobs'}, status_code=503, headers={'Retry-After': '5'})
+    return JSONResponse(job.describe(), status_code=202, headers={'Location': f'/jobs/{job.id}'})
+
+
+async def job_status(request):
+    job, error = _job_or_404(request)
+    return error or JSONResponse(job.describe())
+
+
+async def job_section(request):
+    job, error = _job_or_404(request)
+    if error:
+        return error
+    name = request.path_params['name']
+    if name not in job.expected:
+        return JSONResponse({'error': 'unknown section', 'sections': job.expected}, status_code=404)
+    if name in job.sections:
+        return JSONResponse(job.sections[name])
+    if job.status == 'failed':
+        return JSONResponse({'error': job.error}, status_code=500)
+    return JSONResponse({'status': job.status}, status_code=202)
+
+
+async def job_stream(request):
+    job, error = _job_or_404(request)
+    if error:
+        return error
+
+    async def lines():
+        sent = set()
+        while True:
+            async with job.changed:
+                await job.changed.wait_for(lambda: job.done or any(name not in sent for name in job.sections))
+                ready = [name for name in job.expected if name in job.sections and name not in sent]
+                finished = job.done
+            for name in ready:
+                sent.add(name)
+                yield json.dumps({'section': name, 'data': job.sections[name]}) + '\n'
+            if finished:
+                yield json.dumps({'status': job.status, 'error': job.error}) + '\n'
+                return
+
+    return StreamingResponse(lines(), media_type='application/x-ndjson')
+
+
+async def job_report(request):
+    job, error = _job_or_404(request)
+    if error:
+        return error
+    if job.pdf is None:
+        status = 500 if job.status == 'failed' else 404 if 'pdf' not in job.expected else 202
+        return JSONResponse({'status': job.status, 'error': job.error}, status_code=status)
+    return Response(job.pdf, media_type='application/pdf',
+                    headers={'Content-Disposition': f'attachment; filename="echomind_{job.id}.pdf"'})
+
+
+async def health(request):
+    return JSONResponse(request.app.state.jobs.stats())
+
+
+def create_app(workers=API_WORKERS, max_pending=API_MAX_PENDING, max_jobs=API_MAX_JOBS):
+    jobs = JobManager(workers, max_pending, max_jobs)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        jobs.start()
+        try:
+            yield
+        finally:
+            jobs.shutdown()
+
+    app = Starlette(routes=[
+        Route('/jobs', create_job, methods=['POST']),
+        Route('/jobs/{job_id}', job_status),
+        Route('/jobs/{job_id}/sections/{name}', job_section),
+        Route('/jobs/{job_id}/stream', job_stream),
+        Route('/jobs/{job_id}/report.pdf', job_report),
+        Route('/health', health),
+    ], lifespan=lifespan)
+    app.state.jobs = jobs
+    return app
+
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description='Serve the EchoMind analysis API.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=API_WORKERS, help='analysis processes')
+    parser.add_argument('--max-pending', type=int, default=API_MAX_PENDING,
+                        help='jobs queued or running before uploads are rejected with 503')
+    args = parser.parse_args(argv)
+    uvicorn.run(create_app(args.workers, args.max_pending), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,11 @@
 import streamlit as st
-import preprocessor, helper
-import matplotlib.pyplot as plt
+import helper
+import cache
+import snapshot
+import incremental
+import profiling
+import workspace
+import timeindex
 import seaborn as sns
 import plotly.express as px
 import plotly.graph_objects as go
@@ -34,6 +39,9 @@ def local_css(file_name):
 # Load custom CSS
 local_css("style.css")
 
+# Timelines with more points than this are drawn with WebGL instead of SVG
+WEBGL_MIN_POINTS = 1000
+
 # Simple footer function without HTML
 def simple_footer():
     st.markdown("---")
@@ -127,19 +135,66 @@ elif st.session_state.current_page == "upload":
     st.markdown("## 📊 Upload & Analyze Your Chat")
     st.markdown("Upload your exported chat file to begin comprehensive analysis.")
     
-    uploaded_file = st.file_uploader("Choose a chat file", type=['txt'], key="file_uploader")
+    uploaded_files = st.file_uploader("Choose chat files", type=['txt'], accept_multiple_files=True,
+                                      key="file_uploader")
+    # Content hashes of the uploads, computed once per upload rather than on every rerun
+    known_keys = st.session_state.get('upload_keys', {})
+    upload_keys = {f.file_id: known_keys.get(f.file_id) or cache.content_key(f) for f in uploaded_files}
+    st.session_state.upload_keys = upload_keys
+    uploaded_file = None
+    if len(uploaded_files) > 1:
+        # Several exports: one is analyzed in depth, all of them can be compared
+        chat_names = workspace.display_names([f.name for f in uploaded_files])
+        st.success(f"✅ {len(uploaded_files)} files uploaded successfully!")
+        chosen = st.selectbox("Chat to analyze", range(len(uploaded_files)),
+                              format_func=chat_names.__getitem__, key="chat_choice")
+        uploaded_file = uploaded_files[chosen]
+    elif uploaded_files:
+        uploaded_file = uploaded_files[0]
     
     if uploaded_file is not None:
-        st.success("✅ File uploaded successfully!")
+        if len(uploaded_files) == 1:
+            st.success("✅ File uploaded successfully!")
         
         # Show file details
         file_details = {"Filename": uploaded_file.name, "FileType": uploaded_file.type, "FileSize": f"{uploaded_file.size / 1024:.2f} KB"}
         st.json(file_details)
         
-        # Process the file
-        bytes_data = uploaded_file.getvalue()
-        data = bytes_data.decode("utf-8")
-        df = preprocessor.preprocess(data)
+        # Process the file (streamed in chunks so large exports are never fully decoded in memory).
+        # Results are cached by a hash of the uploaded bytes, so reruns and re-uploads skip the work,
+        # and chats seen before are reloaded from their snapshot when ECHOMIND_SNAPSHOT_DIR is set.
+        # A new export of a chat this session uploaded before (same file name) only has its new
+        # messages parsed.
+        chat_key = upload_keys[uploaded_file.file_id]
+
+        def load_chat():
+            with profiling.stage('app.load_chat', nbytes=uploaded_file.size) as span:
+                df = _load_chat()
+                span.add(rows=len(df))
+            return df
+
+        def _load_chat():
+            # The result cache is shared by every session and export names ("WhatsApp Chat with
+            # ...") are far from unique, so the stored chat is only reused within this session
+            session_id = st.session_state.setdefault('session_id', uuid.uuid4().hex)
+            state_key = ('chat_state', session_id, uploaded_file.name)
+            state = cache.results.get(state_key)
+            if state is None:
+                df = snapshot.load_or_parse(uploaded_file, chat_key)
+                state = incremental.ChatState.from_file(uploaded_file, df)
+            else:
+                state, _ = incremental.update(state, uploaded_file, chat_key)
+            # Keyed by session, so there is nothing to reload from the disk tier after a restart
+            cache.results.put(state_key, state, disk=False)
+            return state.df
+
+        df = cache.results.get_or_compute((chat_key, 'preprocess'), load_chat)
+        chats = []
+        if len(uploaded_files) > 1:
+            # The other chats are parsed concurrently and only their aggregates are kept
+            with st.spinner("Loading the other chats..."):
+                chats = workspace.load_chats(uploaded_files, loaded={chat_key: df},
+                                             keys=[upload_keys[f.file_id] for f in uploaded_files])
         # Debug: Show first few rows and check for valid dates
         st.markdown('#### 🐞 Debug: Parsed Data Preview')
         st.dataframe(df.head(10))
@@ -156,11 +211,52 @@ elif st.session_state.current_page == "upload":
             # Analysis options in sidebar
             st.sidebar.markdown("### 📋 Analysis Options")
             selected_user = st.sidebar.selectbox("Select User for Analysis", user_list)
+
+            # Sections only see the messages of the chosen dates; the range is looked up in a
+            # date-sorted index of the chat, so moving the slider never rescans the whole chat
+            view_key = chat_key
+            first, last = timeindex.build_time_index(df).span()
+            if first.date() < last.date():
+                date_range = st.sidebar.slider("Date Range", min_value=first.date(), max_value=last.date(),
+                                               value=(first.date(), last.date()), format="YYYY-MM-DD",
+                                               key=f"date_range_{chat_key}")
+                if date_range != (first.date(), last.date()):
+                    view_key = (chat_key, 'range', *date_range)
+                    start, end = pd.Timestamp(date_range[0]), pd.Timestamp(date_range[1]) + pd.Timedelta(days=1)
+                    total_messages = len(df)
+                    df = cache.results.get_or_compute(view_key, lambda: timeindex.select(df, start, end))
+                    st.sidebar.caption(f"{len(df):,} of {total_messages:,} messages in range")
+
+            def cached(name, func):
+                return cache.results.get_or_compute((view_key, selected_user, name),
+                                                    lambda: func(selected_user, df))
+
+            cache_stats = cache.results.stats()
+            st.sidebar.caption(f"Cache: {cache_stats['hits'] + cache_stats['disk_hits']} hits, "
+                               f"{cache_stats['misses']} misses, "
+                               f"{cache_stats['size_bytes'] / (1024 * 1024):.1f} MB")
             
+            # The analysis page stays open across reruns of this chat (e.g. when a section is switched on)
             if st.sidebar.button("🚀 Show Analysis", type="primary"):
+                st.session_state.analysis_chat = chat_key
+
+            @st.fragment
+            def lazy_section(name, title, render, description=None):
+                # Sections are computed only once switched on; toggling one reruns just that section
+                st.markdown(f"### {title}")
+                if description:
+                    st.markdown(description)
+                if st.toggle("Show section", key=f"section_{name}"):
+                    with st.spinner("Computing..."), profiling.stage(f'app.section.{name}'):
+                        render()
+                else:
+                    st.caption("Switch on to compute this section.")
+
+            if st.session_state.get('analysis_chat') == chat_key:
                 # Stats Area with cards
                 st.markdown("### 📊 Chat Statistics")
-                num_messages, words, num_media_messages, num_links = helper.fetch_stats(selected_user, df)
+                with profiling.stage('app.section.stats'):
+                    num_messages, words, num_media_messages, num_links = cached('stats', helper.fetch_stats)
                 
                 col1, col2, col3, col4 = st.columns(4)
                 with col1:
@@ -193,111 +289,121 @@ elif st.session_state.current_page == "upload":
                     """, unsafe_allow_html=True)
                 
                 st.markdown("---")
-                
-                # Timeline visualization
-                st.markdown("### 📅 Timeline Analysis")
-                
-                # Monthly Timeline
-                st.markdown("#### 📈 Monthly Activity")
-                timeline = helper.monthly_timeline(selected_user, df)
-                fig = px.line(timeline, x='time', y='message', 
-                             title='Monthly Message Count',
-                             labels={'time': 'Month', 'message': 'Number of Messages'},
-                             template='plotly_dark')
-                fig.update_traces(line=dict(color='#4f46e5', width=3))
-                fig.update_layout(plot_bgcolor='rgba(0,0,0,0)',
-                                paper_bgcolor='rgba(0,0,0,0)',
-                                xaxis=dict(showgrid=False, color='#b8b8b8'),
-                                yaxis=dict(showgrid=True, gridcolor='#374151', color='#b8b8b8'),
-                                font=dict(color='#ffffff'))
-                st.plotly_chart(fig, use_container_width=True)
-
-                # Daily Timeline
-                st.markdown("#### 📊 Daily Activity")
-                daily_timeline = helper.daily_timeline(selected_user, df)
-                fig = px.area(daily_timeline, x='only_date', y='message',
-                             title='Daily Message Count',
-                             labels={'only_date': 'Date', 'message': 'Number of Messages'},
-                             template='plotly_dark')
-                fig.update_traces(fill='tozeroy', line=dict(color='#7c3aed', width=2))
-                fig.update_layout(plot_bgcolor='rgba(0,0,0,0)',
-                                paper_bgcolor='rgba(0,0,0,0)',
-                                xaxis=dict(showgrid=False, color='#b8b8b8'),
-                                yaxis=dict(showgrid=True, gridcolor='#374151', color='#b8b8b8'),
-                                font=dict(color='#ffffff'))
-                st.plotly_chart(fig, use_container_width=True)
-                
-                # Activity Map
-                st.markdown("### 📊 Activity Map")
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.markdown("#### 📅 Most Active Day")
-                    busy_day = helper.week_activity_map(selected_user, df)
-                    busy_day_df = busy_day.reset_index()
-                    busy_day_df.columns = ['Day of Week', 'Number of Messages']
-                    fig = px.bar(
-                        busy_day_df,
-                        x='Day of Week',
-                        y='Number of Messages',
-                        labels={'x': 'Day of Week', 'y': 'Number of Messages'},
-                        color_discrete_sequence=['#4f46e5'],
-                        template='plotly_dark'
-                    )
+
+                def show_timelines():
+                    # Monthly Timeline
+                    st.markdown("#### 📈 Monthly Activity")
+                    timeline = cached('monthly_timeline', helper.monthly_timeline)
+                    fig = px.line(timeline, x='time', y='message', 
+                                 title='Monthly Message Count',
+                                 labels={'time': 'Month', 'message': 'Number of Messages'},
+                                 template='plotly_dark')
+                    fig.update_traces(line=dict(color='#4f46e5', width=3))
                     fig.update_layout(plot_bgcolor='rgba(0,0,0,0)',
                                     paper_bgcolor='rgba(0,0,0,0)',
                                     xaxis=dict(showgrid=False, color='#b8b8b8'),
                                     yaxis=dict(showgrid=True, gridcolor='#374151', color='#b8b8b8'),
                                     font=dict(color='#ffffff'))
                     st.plotly_chart(fig, use_container_width=True)
-                
-                with col2:
-                    st.markdown("#### 📆 Most Active Month")
-                    busy_month = helper.month_activity_map(selected_user, df)
-                    busy_month_df = busy_month.reset_index()
-                    busy_month_df.columns = ['Month', 'Number of Messages']
-                    fig = px.bar(
-                        busy_month_df,
-                        x='Month',
-                        y='Number of Messages',
-                        labels={'x': 'Month', 'y': 'Number of Messages'},
-                        color_discrete_sequence=['#7c3aed'],
-                        template='plotly_dark'
-                    )
+
+                    # Daily Timeline (multi-year chats are resampled or downsampled to a few
+                    # thousand points and drawn with WebGL, so the page stays light)
+                    st.markdown("#### 📊 Daily Activity")
+                    freq = st.radio("Granularity", list(helper.TIMELINE_FREQUENCIES), horizontal=True,
+                                    format_func=str.title, key="daily_granularity")
+                    daily_timeline, points = cache.results.get_or_compute(
+                        (view_key, selected_user, 'activity_timeline', freq, helper.TIMELINE_MAX_POINTS),
+                        lambda: helper.activity_timeline(selected_user, df, freq))
+                    title = {'day': 'Daily', 'week': 'Weekly', 'month': 'Monthly'}[freq] + ' Message Count'
+                    if len(daily_timeline) > WEBGL_MIN_POINTS:
+                        fig = go.Figure(go.Scattergl(x=daily_timeline['date'], y=daily_timeline['message'],
+                                                     mode='lines', fill='tozeroy'))
+                        fig.update_layout(title=title, xaxis_title='Date', yaxis_title='Number of Messages',
+                                          template='plotly_dark')
+                    else:
+                        fig = px.area(daily_timeline, x='date', y='message',
+                                     title=title,
+                                     labels={'date': 'Date', 'message': 'Number of Messages'},
+                                     template='plotly_dark')
+                    fig.update_traces(fill='tozeroy', line=dict(color='#7c3aed', width=2))
                     fig.update_layout(plot_bgcolor='rgba(0,0,0,0)',
                                     paper_bgcolor='rgba(0,0,0,0)',
                                     xaxis=dict(showgrid=False, color='#b8b8b8'),
                                     yaxis=dict(showgrid=True, gridcolor='#374151', color='#b8b8b8'),
                                     font=dict(color='#ffffff'))
                     st.plotly_chart(fig, use_container_width=True)
-                
-                # Weekly Activity Heatmap
-                st.markdown("#### 🔥 Weekly Activity Heatmap")
-                user_heatmap = helper.activity_heatmap(selected_user, df)
-                if user_heatmap is not None and not user_heatmap.empty:
-                    try:
-                        fig = px.imshow(user_heatmap.values,
-                                      labels=dict(x="Hour of Day", y="Day of Week", color="Messages"),
-                                      x=[f"{h:02d}:00" for h in range(24)],
-                                      y=['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'],
-                                      color_continuous_scale='Viridis',
-                                      template='plotly_dark')
+                    if len(daily_timeline) < points:
+                        st.caption(f"Showing {len(daily_timeline):,} of {points:,} points; "
+                                   "the highest and lowest count of each stretch is kept.")
+
+                def show_activity_map():
+                    col1, col2 = st.columns(2)
+
+                    with col1:
+                        st.markdown("#### 📅 Most Active Day")
+                        busy_day = cached('week_activity_map', helper.week_activity_map)
+                        busy_day_df = busy_day.reset_index()
+                        busy_day_df.columns = ['Day of Week', 'Number of Messages']
+                        fig = px.bar(
+                            busy_day_df,
+                            x='Day of Week',
+                            y='Number of Messages',
+                            labels={'x': 'Day of Week', 'y': 'Number of Messages'},
+                            color_discrete_sequence=['#4f46e5'],
+                            template='plotly_dark'
+                        )
                         fig.update_layout(plot_bgcolor='rgba(0,0,0,0)',
                                         paper_bgcolor='rgba(0,0,0,0)',
                                         xaxis=dict(showgrid=False, color='#b8b8b8'),
-                                        yaxis=dict(showgrid=False, color='#b8b8b8'),
+                                        yaxis=dict(showgrid=True, gridcolor='#374151', color='#b8b8b8'),
                                         font=dict(color='#ffffff'))
                         st.plotly_chart(fig, use_container_width=True)
-                    except Exception as e:
-                        st.warning("Unable to display heatmap. Data may be insufficient.")
-                else:
-                    st.info("Not enough data to generate activity heatmap.")
-                
-                # Finding the busiest users in the group (Group level only)
-                if selected_user == 'Overall':
-                    st.markdown("### 👥 User Activity")
-                    x, new_df = helper.most_busy_users(df)
-                    
+
+                    with col2:
+                        st.markdown("#### 📆 Most Active Month")
+                        busy_month = cached('month_activity_map', helper.month_activity_map)
+                        busy_month_df = busy_month.reset_index()
+                        busy_month_df.columns = ['Month', 'Number of Messages']
+                        fig = px.bar(
+                            busy_month_df,
+                            x='Month',
+                            y='Number of Messages',
+                            labels={'x': 'Month', 'y': 'Number of Messages'},
+                            color_discrete_sequence=['#7c3aed'],
+                            template='plotly_dark'
+                        )
+                        fig.update_layout(plot_bgcolor='rgba(0,0,0,0)',
+                                        paper_bgcolor='rgba(0,0,0,0)',
+                                        xaxis=dict(showgrid=False, color='#b8b8b8'),
+                                        yaxis=dict(showgrid=True, gridcolor='#374151', color='#b8b8b8'),
+                                        font=dict(color='#ffffff'))
+                        st.plotly_chart(fig, use_container_width=True)
+
+                def show_heatmap():
+                    user_heatmap = cached('activity_heatmap', helper.activity_heatmap)
+                    if user_heatmap is not None and not user_heatmap.empty:
+                        try:
+                            fig = px.imshow(user_heatmap.values,
+                                          labels=dict(x="Hour of Day", y="Day of Week", color="Messages"),
+                                          x=[f"{h:02d}:00" for h in range(24)],
+                                          y=['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'],
+                                          color_continuous_scale='Viridis',
+                                          template='plotly_dark')
+                            fig.update_layout(plot_bgcolor='rgba(0,0,0,0)',
+                                            paper_bgcolor='rgba(0,0,0,0)',
+                                            xaxis=dict(showgrid=False, color='#b8b8b8'),
+                                            yaxis=dict(showgrid=False, color='#b8b8b8'),
+                                            font=dict(color='#ffffff'))
+                            st.plotly_chart(fig, use_container_width=True)
+                        except Exception as e:
+                            st.warning("Unable to display heatmap. Data may be insufficient.")
+                    else:
+                        st.info("Not enough data to generate activity heatmap.")
+
+                def show_busy_users():
+                    x, new_df = cache.results.get_or_compute((view_key, 'most_busy_users'),
+                                                         lambda: helper.most_busy_users(df))
+
                     col1, col2 = st.columns(2)
                     with col1:
                         st.markdown("#### 🏆 Most Active Users")
@@ -313,176 +419,365 @@ elif st.session_state.current_page == "upload":
                                         font=dict(color='#ffffff'),
                                         showlegend=False)
                         st.plotly_chart(fig, use_container_width=True)
-                    
+
                     with col2:
                         st.markdown("#### 📊 User Activity Distribution")
                         st.dataframe(new_df.style.background_gradient(cmap='Blues'),
                                    use_container_width=True)
 
-                # Word Cloud Analysis
-                st.markdown("### 📝 Word Cloud")
-                st.markdown("Visual representation of the most frequently used words in the conversation.")
-                df_wc = helper.create_wordcloud(selected_user, df)
-                fig, ax = plt.subplots(figsize=(10, 6))
-                ax.imshow(df_wc, interpolation='bilinear')
-                ax.axis('off')
-                plt.tight_layout()
-                st.pyplot(fig, use_container_width=True)
-                
-                # Most Common Words
-                st.markdown("### 📊 Most Common Words")
-                most_common_df = helper.most_common_words(selected_user, df)
-                
-                if not most_common_df.empty:
-                    fig = px.bar(most_common_df.head(20), 
-                                x=most_common_df[1].head(20), 
-                                y=most_common_df[0].head(20),
-                                orientation='h',
-                                labels={'x': 'Frequency', 'y': 'Words'},
-                                color=most_common_df[1].head(20),
-                                color_continuous_scale='Viridis',
-                                template='plotly_dark')
+                def show_wordcloud():
+                    max_words = st.select_slider("Words in cloud", options=[50, 100, 200, 500],
+                                                 value=helper.WORDCLOUD_MAX_WORDS, key="wordcloud_words")
+                    width, height = 500, 500
+                    # Rendered images are cached per chat, user, size and word count
+                    try:
+                        wordcloud_image = cache.results.get_or_compute(
+                            (view_key, selected_user, 'wordcloud', width, height, max_words),
+                            lambda: helper.create_wordcloud(selected_user, df, width, height, max_words).to_array())
+                    except ValueError:
+                        st.info("Not enough words to generate a word cloud.")
+                        return
+                    st.image(wordcloud_image, width=width)
+
+                def show_common_words():
+                    most_common_df = cached('most_common_words', helper.most_common_words)
+
+                    if not most_common_df.empty:
+                        fig = px.bar(most_common_df.head(20), 
+                                    x=most_common_df[1].head(20), 
+                                    y=most_common_df[0].head(20),
+                                    orientation='h',
+                                    labels={'x': 'Frequency', 'y': 'Words'},
+                                    color=most_common_df[1].head(20),
+                                    color_continuous_scale='Viridis',
+                                    template='plotly_dark')
+                        fig.update_layout(plot_bgcolor='rgba(0,0,0,0)',
+                                        paper_bgcolor='rgba(0,0,0,0)',
+                                        xaxis=dict(showgrid=False, color='#b8b8b8'),
+                                        yaxis=dict(showgrid=True, gridcolor='#374151', color='#b8b8b8'),
+                                        font=dict(color='#ffffff'),
+                                        showlegend=False,
+                                        height=600)
+                        st.plotly_chart(fig, use_container_width=True)
+                    else:
+                        st.info("Not enough data to display common words.")
+
+                def show_detailed_stats():
+                    # Calculate additional statistics
+                    total_days = (df['date'].max() - df['date'].min()).days + 1 if len(df) > 0 else 0
+                    avg_messages_per_day = num_messages / total_days if total_days > 0 else 0
+                    avg_words_per_message = words / num_messages if num_messages > 0 else 0
+                    media_ratio = num_media_messages / num_messages * 100 if num_messages > 0 else 0
+
+                    # Display detailed stats in columns
+                    col1, col2, col3, col4 = st.columns(4)
+                    with col1:
+                        st.markdown(f"""
+                        <div class='stat-card'>
+                            <h3>Avg Messages/Day</h3>
+                            <h2>{avg_messages_per_day:.1f}</h2>
+                        </div>
+                        """, unsafe_allow_html=True)
+                    with col2:
+                        st.markdown(f"""
+                        <div class='stat-card'>
+                            <h3>Avg Words/Message</h3>
+                            <h2>{avg_words_per_message:.1f}</h2>
+                        </div>
+                        """, unsafe_allow_html=True)
+                    with col3:
+                        st.markdown(f"""
+                        <div class='stat-card'>
+                            <h3>Total Days</h3>
+                            <h2>{total_days}</h2>
+                        </div>
+                        """, unsafe_allow_html=True)
+                    with col4:
+                        st.markdown(f"""
+                        <div class='stat-card'>
+                            <h3>Media Ratio</h3>
+                            <h2>{media_ratio:.1f}%</h2>
+                        </div>
+                        """, unsafe_allow_html=True)
+
+                def show_emojis():
+                    emoji_df = cached('emoji_helper', helper.emoji_helper)
+
+                    if not emoji_df.empty and len(emoji_df) > 0:
+                        col1, col2 = st.columns(2)
+
+                        with col1:
+                            st.markdown("#### 🎯 Top Emojis Used")
+                            st.dataframe(emoji_df.head(10).style.background_gradient(cmap='YlOrRd'),
+                                       use_container_width=True)
+
+                        with col2:
+                            st.markdown("#### 📊 Emoji Distribution")
+                            if len(emoji_df) >= 5:
+                                fig = px.pie(emoji_df.head(5), 
+                                           values=emoji_df[1].head(5), 
+                                           names=emoji_df[0].head(5),
+                                           hole=0.5,
+                                           color_discrete_sequence=px.colors.sequential.RdBu,
+                                           template='plotly_dark')
+                                fig.update_traces(textposition='inside', textinfo='percent+label')
+                                fig.update_layout(showlegend=False,
+                                                margin=dict(t=0, b=0, l=0, r=0),
+                                                font=dict(color='#ffffff'))
+                                st.plotly_chart(fig, use_container_width=True)
+                            else:
+                                st.info("Not enough emoji data for visualization")
+
+                        # Most Used Emojis Bar Chart
+                        st.markdown("#### 📈 Most Used Emojis Trend")
+                        if len(emoji_df) >= 10:
+                            fig = px.bar(emoji_df.head(10), 
+                                       x=emoji_df[0].head(10), 
+                                       y=emoji_df[1].head(10),
+                                       labels={'x': 'Emoji', 'y': 'Frequency'},
+                                       color=emoji_df[1].head(10),
+                                       color_continuous_scale='Viridis',
+                                       template='plotly_dark')
+                            fig.update_layout(plot_bgcolor='rgba(0,0,0,0)',
+                                            paper_bgcolor='rgba(0,0,0,0)',
+                                            xaxis=dict(showgrid=False, color='#b8b8b8'),
+                                            yaxis=dict(showgrid=True, gridcolor='#374151', color='#b8b8b8'),
+                                            font=dict(color='#ffffff'),
+                                            showlegend=False)
+                            st.plotly_chart(fig, use_container_width=True)
+                    else:
+                        st.info("No emoji data available for analysis.")
+
+                def show_sentiment():
+                    mean_score, label_counts = cached('sentiment_breakdown', helper.sentiment_breakdown)
+                    if label_counts.sum() == 0:
+                        st.info("No text messages to analyze.")
+                        return
+
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        st.markdown(f"""
+                        <div class='stat-card'>
+                            <h3>Average Sentiment</h3>
+                            <h2>{mean_score:+.2f}</h2>
+                        </div>
+                        """, unsafe_allow_html=True)
+                    with col2:
+                        fig = px.pie(values=label_counts.values, names=label_counts.index.str.title(),
+                                   hole=0.5,
+                                   color=label_counts.index.str.title(),
+                                   color_discrete_map={'Positive': '#10b981', 'Neutral': '#6b7280', 'Negative': '#ef4444'},
+                                   template='plotly_dark')
+                        fig.update_traces(textposition='inside', textinfo='percent+label')
+                        fig.update_layout(showlegend=False,
+                                        margin=dict(t=0, b=0, l=0, r=0),
+                                        height=250,
+                                        font=dict(color='#ffffff'))
+                        st.plotly_chart(fig, use_container_width=True)
+
+                    st.markdown("#### 📈 Monthly Mood")
+                    timeline = cached('sentiment_timeline', helper.sentiment_timeline)
+                    fig = px.line(timeline, x='time', y='sentiment',
+                                 labels={'time': 'Month', 'sentiment': 'Average Sentiment'},
+                                 template='plotly_dark')
+                    fig.update_traces(line=dict(color='#10b981', width=3))
                     fig.update_layout(plot_bgcolor='rgba(0,0,0,0)',
                                     paper_bgcolor='rgba(0,0,0,0)',
                                     xaxis=dict(showgrid=False, color='#b8b8b8'),
                                     yaxis=dict(showgrid=True, gridcolor='#374151', color='#b8b8b8'),
-                                    font=dict(color='#ffffff'),
-                                    showlegend=False,
-                                    height=600)
+                                    font=dict(color='#ffffff'))
                     st.plotly_chart(fig, use_container_width=True)
-                else:
-                    st.info("Not enough data to display common words.")
-                
-                # Enhanced Chat Statistics
-                st.markdown("### 📊 Detailed Chat Statistics")
-                
-                # Calculate additional statistics
-                total_days = (df['date'].max() - df['date'].min()).days + 1 if len(df) > 0 else 0
-                avg_messages_per_day = num_messages / total_days if total_days > 0 else 0
-                avg_words_per_message = words / num_messages if num_messages > 0 else 0
-                
-                # Display detailed stats in columns
-                col1, col2, col3, col4 = st.columns(4)
-                with col1:
-                    st.markdown(f"""
-                    <div class='stat-card'>
-                        <h3>Avg Messages/Day</h3>
-                        <h2>{avg_messages_per_day:.1f}</h2>
-                    </div>
-                    """, unsafe_allow_html=True)
-                with col2:
-                    st.markdown(f"""
-                    <div class='stat-card'>
-                        <h3>Avg Words/Message</h3>
-                        <h2>{avg_words_per_message:.1f}</h2>
-                    </div>
-                    """, unsafe_allow_html=True)
-                with col3:
-                    st.markdown(f"""
-                    <div class='stat-card'>
-                        <h3>Total Days</h3>
-                        <h2>{total_days}</h2>
-                    </div>
-                    """, unsafe_allow_html=True)
-                with col4:
-                    st.markdown(f"""
-                    <div class='stat-card'>
-                        <h3>Media Ratio</h3>
-                        <h2>{(num_media_messages/num_messages*100):.1f}%</h2>
-                    </div>
-                    """, unsafe_allow_html=True)
-                
-                # Emoji Analysis
-                st.markdown("### 😊 Emoji Analysis")
-                emoji_df = helper.emoji_helper(selected_user, df)
-                
-                if not emoji_df.empty and len(emoji_df) > 0:
+
+                    if selected_user == 'Overall':
+                        st.markdown("#### 👥 Sentiment by User")
+                        users = cache.results.get_or_compute((view_key, 'user_sentiment'),
+                                                             lambda: helper.user_sentiment(df))
+                        fig = px.bar(users.reset_index(), x='user', y='sentiment',
+                                    labels={'user': 'User', 'sentiment': 'Average Sentiment'},
+                                    color='sentiment',
+                                    color_continuous_scale='RdYlGn',
+                                    color_continuous_midpoint=0,
+                                    template='plotly_dark')
+                        fig.update_layout(plot_bgcolor='rgba(0,0,0,0)',
+                                        paper_bgcolor='rgba(0,0,0,0)',
+                                        xaxis=dict(showgrid=False, color='#b8b8b8'),
+                                        yaxis=dict(showgrid=True, gridcolor='#374151', color='#b8b8b8'),
+                                        font=dict(color='#ffffff'))
+                        st.plotly_chart(fig, use_container_width=True)
+
+                    st.markdown("#### 🔥 Mood by Day and Hour")
+                    mood_heatmap = cached('sentiment_heatmap', helper.sentiment_heatmap)
+                    fig = px.imshow(mood_heatmap.values,
+                                  labels=dict(x="Hour of Day", y="Day of Week", color="Sentiment"),
+                                  x=[str(period) for period in mood_heatmap.columns],
+                                  y=[str(day) for day in mood_heatmap.index],
+                                  color_continuous_scale='RdYlGn',
+                                  color_continuous_midpoint=0,
+                                  template='plotly_dark')
+                    fig.update_layout(plot_bgcolor='rgba(0,0,0,0)',
+                                    paper_bgcolor='rgba(0,0,0,0)',
+                                    xaxis=dict(showgrid=False, color='#b8b8b8'),
+                                    yaxis=dict(showgrid=False, color='#b8b8b8'),
+                                    font=dict(color='#ffffff'))
+                    st.plotly_chart(fig, use_container_width=True)
+
+                def show_conversations():
+                    sessions, session_minutes, session_messages, reply_minutes, started = cached(
+                        'conversation_stats', helper.conversation_stats)
+                    if sessions == 0:
+                        st.info("Not enough messages to find conversations.")
+                        return
+
+                    col1, col2, col3, col4 = st.columns(4)
+                    for col, label, value in [(col1, "Sessions", f"{sessions:,}"),
+                                              (col2, "Sessions Started", f"{started:,}"),
+                                              (col3, "Median Session", f"{session_minutes:.0f} min"),
+                                              (col4, "Median Reply", f"{reply_minutes:.1f} min")]:
+                        with col:
+                            st.markdown(f"""
+                            <div class='stat-card'>
+                                <h3>{label}</h3>
+                                <h2>{value}</h2>
+                            </div>
+                            """, unsafe_allow_html=True)
+                    st.caption(f"A silence of more than {helper.SESSION_GAP_MINUTES:g} minutes starts a new session; "
+                               f"a session lasts {session_messages:.0f} messages at the median.")
+
                     col1, col2 = st.columns(2)
-                    
                     with col1:
-                        st.markdown("#### 🎯 Top Emojis Used")
-                        st.dataframe(emoji_df.head(10).style.background_gradient(cmap='YlOrRd'),
-                                   use_container_width=True)
-                    
-                    with col2:
-                        st.markdown("#### 📊 Emoji Distribution")
-                        if len(emoji_df) >= 5:
-                            fig = px.pie(emoji_df.head(5), 
-                                       values=emoji_df[1].head(5), 
-                                       names=emoji_df[0].head(5),
-                                       hole=0.5,
-                                       color_discrete_sequence=px.colors.sequential.RdBu,
-                                       template='plotly_dark')
-                            fig.update_traces(textposition='inside', textinfo='percent+label')
-                            fig.update_layout(showlegend=False,
-                                            margin=dict(t=0, b=0, l=0, r=0),
-                                            font=dict(color='#ffffff'))
-                            st.plotly_chart(fig, use_container_width=True)
-                        else:
-                            st.info("Not enough emoji data for visualization")
-                            
-                    # Most Used Emojis Bar Chart
-                    st.markdown("#### 📈 Most Used Emojis Trend")
-                    if len(emoji_df) >= 10:
-                        fig = px.bar(emoji_df.head(10), 
-                                   x=emoji_df[0].head(10), 
-                                   y=emoji_df[1].head(10),
-                                   labels={'x': 'Emoji', 'y': 'Frequency'},
-                                   color=emoji_df[1].head(10),
-                                   color_continuous_scale='Viridis',
-                                   template='plotly_dark')
+                        st.markdown("#### 🚀 Who Starts Conversations")
+                        starters = cached('conversation_starters', helper.conversation_starters).head(10)
+                        fig = px.bar(x=starters.index, y=starters.values,
+                                    labels={'x': 'User', 'y': 'Sessions Started'},
+                                    color_discrete_sequence=['#0ea5e9'],
+                                    template='plotly_dark')
                         fig.update_layout(plot_bgcolor='rgba(0,0,0,0)',
                                         paper_bgcolor='rgba(0,0,0,0)',
                                         xaxis=dict(showgrid=False, color='#b8b8b8'),
                                         yaxis=dict(showgrid=True, gridcolor='#374151', color='#b8b8b8'),
-                                        font=dict(color='#ffffff'),
-                                        showlegend=False)
+                                        font=dict(color='#ffffff'))
                         st.plotly_chart(fig, use_container_width=True)
-                else:
-                    st.info("No emoji data available for analysis.")
-                
-                # Download PDF Report
-                st.markdown("### 📄 Download Report")
-                
-                # Create PDF report
-                try:
-                    pdf_buffer = create_pdf_report(df, selected_user, num_messages, words, num_media_messages, num_links)
-                    
-                    # Display download button
-                    st.download_button(
-                        label="📄 Download PDF Report",
-                        data=pdf_buffer.getvalue(),
-                        file_name=f"echomind_report_{selected_user}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
-                        mime="application/pdf",
-                        key="pdf_download"
-                    )
-                    
-                    st.success("✅ PDF report generated successfully! Click the button above to download.")
-                    
-                except Exception as e:
-                    st.error(f"❌ Error generating PDF report: {str(e)}")
-                    st.info("Please try again or contact support if the issue persists.")
-                
+
+                    with col2:
+                        st.markdown("#### ⏱️ Reply Times")
+                        if selected_user == 'Overall':
+                            responders = cache.results.get_or_compute((view_key, 'user_response_times'),
+                                                                      lambda: helper.user_response_times(df))
+                            st.dataframe(responders.round(1).style.background_gradient(cmap='Blues', subset=['replies']),
+                                       use_container_width=True)
+                        else:
+                            pairs = cached('response_times', helper.response_times)
+                            st.dataframe(pairs.set_index('replied_to').drop(columns='user').round(1),
+                                       use_container_width=True)
+
+                def show_compare():
+                    st.markdown("#### 📋 Chats")
+                    st.dataframe(workspace.chat_summary(chats), use_container_width=True)
+
+                    st.markdown("#### 📅 Monthly Messages")
+                    timeline = workspace.compare_timelines(chats).reset_index().melt(
+                        id_vars='date', var_name='chat', value_name='messages')
+                    fig = px.line(timeline, x='date', y='messages', color='chat', template='plotly_dark')
+                    fig.update_layout(plot_bgcolor='rgba(0,0,0,0)',
+                                    paper_bgcolor='rgba(0,0,0,0)',
+                                    xaxis=dict(showgrid=False, color='#b8b8b8'),
+                                    yaxis=dict(showgrid=True, gridcolor='#374151', color='#b8b8b8'),
+                                    font=dict(color='#ffffff'))
+                    st.plotly_chart(fig, use_container_width=True)
+
+                    st.markdown("#### 👥 User Overlap")
+                    shared_users, shared_counts = workspace.user_overlap(chats)
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        if shared_users.empty:
+                            st.info("No user appears in more than one chat.")
+                        else:
+                            st.dataframe(shared_users, use_container_width=True)
+                    with col2:
+                        fig = px.imshow(shared_counts, text_auto=True, color_continuous_scale='Blues',
+                                        labels={'color': 'Shared Users'}, template='plotly_dark')
+                        fig.update_layout(plot_bgcolor='rgba(0,0,0,0)',
+                                        paper_bgcolor='rgba(0,0,0,0)',
+                                        font=dict(color='#ffffff'))
+                        st.plotly_chart(fig, use_container_width=True)
+
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        st.markdown("#### 📝 Distinctive Words")
+                        st.dataframe(workspace.distinctive_terms(chats, 'words'), use_container_width=True)
+                    with col2:
+                        st.markdown("#### 😊 Distinctive Emojis")
+                        st.dataframe(workspace.distinctive_terms(chats, 'emojis'), use_container_width=True)
+
+                lazy_section('timelines', "📅 Timeline Analysis", show_timelines)
+                lazy_section('activity_map', "📊 Activity Map", show_activity_map)
+                lazy_section('heatmap', "🔥 Weekly Activity Heatmap", show_heatmap)
+                # Finding the busiest users in the group (Group level only)
+                if selected_user == 'Overall':
+                    lazy_section('busy_users', "👥 User Activity", show_busy_users)
+                lazy_section('wordcloud', "📝 Word Cloud", show_wordcloud,
+                             "Visual representation of the most frequently used words in the conversation.")
+                lazy_section('common_words', "📊 Most Common Words", show_common_words)
+                lazy_section('detailed_stats', "📊 Detailed Chat Statistics", show_detailed_stats)
+                lazy_section('emojis', "😊 Emoji Analysis", show_emojis)
+                lazy_section('sentiment', "🔍 Sentiment Analysis", show_sentiment,
+                             "Offline English and Hinglish lexicon scores, from -1 (negative) to +1 (positive).")
+                lazy_section('conversations', "💬 Conversation Dynamics", show_conversations,
+                             "Conversation sessions, who starts them and how quickly people reply to each other.")
+                if chats:
+                    lazy_section('compare', "🔀 Compare Chats", show_compare,
+                                 "All uploaded chats side by side, computed from their stored aggregates.")
+
+                # Download PDF Report (built only on request; the report renders every chart)
+                @st.fragment
+                def report_section():
+                    st.markdown("### 📄 Download Report")
+                    report_key = (view_key, selected_user, 'pdf_report')
+                    if st.button("🛠️ Generate PDF Report", key="pdf_generate"):
+                        try:
+                            with st.spinner("Building PDF report..."):
+                                with profiling.stage('app.section.pdf_report'):
+                                    pdf_buffer = create_pdf_report(df, selected_user, num_messages, words, num_media_messages, num_links)
+                            cache.results.put(report_key, pdf_buffer.getvalue())
+                        except Exception as e:
+                            st.error(f"❌ Error generating PDF report: {str(e)}")
+                            st.info("Please try again or contact support if the issue persists.")
+
+                    pdf_bytes = cache.results.get(report_key)
+                    if pdf_bytes is not None:
+                        # Display download button
+                        st.download_button(
+                            label="📄 Download PDF Report",
+                            data=pdf_bytes,
+                            file_name=f"echomind_report_{selected_user}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
+                            mime="application/pdf",
+                            key="pdf_download"
+                        )
+                        st.success("✅ PDF report generated successfully! Click the button above to download.")
+                    else:
+                        st.caption("The report is built when you ask for it.")
+
+                report_section()
+
                 # Add QR Code for sharing
                 st.markdown("### 📱 Share Your Analysis")
                 st.markdown("Share your chat analysis with others!")
-                
-                # Generate QR code for the app URL
-                # Create QR code
-                qr = qrcode.QRCode(version=1, box_size=10, border=5)
-                qr.add_data("https://echomind-app.streamlit.app/")
-                qr.make(fit=True)
-                
-                # Create QR code image
-                qr_img = qr.make_image(fill_color="black", back_color="white")
-                
-                # Convert to bytes for display
-                img_buffer = io.BytesIO()
-                qr_img.save(img_buffer, format='PNG')
-                img_buffer.seek(0)
-                
-                # Display QR code
-                st.image(img_buffer, caption="Scan to share EchoMind", width=200)
+
+                def make_qr_code():
+                    # Generate QR code for the app URL
+                    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+                    qr.add_data("https://echomind-app.streamlit.app/")
+                    qr.make(fit=True)
+
+                    # Create QR code image and convert to bytes for display
+                    qr_img = qr.make_image(fill_color="black", back_color="white")
+                    img_buffer = io.BytesIO()
+                    qr_img.save(img_buffer, format='PNG')
+                    return img_buffer.getvalue()
+
+                # Display QR code (the same for every chat, so generated once per process)
+                st.image(cache.results.get_or_compute(('qr_code',), make_qr_code),
+                         caption="Scan to share EchoMind", width=200)
                 
                 # Add simple footer
                 simple_footer()
@@ -566,3 +861,22 @@ elif st.session_state.current_page == "about":
     
     # Add simple footer
     simple_footer()
+
+# Performance panel: per-stage timings of this server process (reflects runs up to the previous rerun)
+if profiling.ENABLED:
+    with st.sidebar.expander("⏱️ Performance"):
+        perf = profiling.snapshot()
+        st.caption(f"Memory: {perf['rss_bytes'] / (1024 * 1024):.0f} MB now, "
+                   f"{perf['peak_rss_bytes'] / (1024 * 1024):.0f} MB peak")
+        stage_table = profiling.stage_table()
+        if stage_table.empty:
+            st.caption("No stages recorded yet.")
+        else:
+            st.dataframe(stage_table[['calls', 'total_seconds', 'mean_seconds', 'max_seconds', 'rows', 'bytes']],
+                         use_container_width=True)
+        st.download_button("Download JSON", profiling.to_json(), file_name="echomind_profile.json",
+                           mime="application/json", key="perf_json")
+        st.download_button("Download Prometheus metrics", profiling.to_prometheus(), file_name="echomind_metrics.prom",
+                           mime="text/plain", key="perf_prom")
+        if st.button("Reset timings", key="perf_reset"):
+            profiling.reset()
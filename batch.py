@@ -0,0 +1,225 @@
+"""Headless batch analysis of WhatsApp chat exports.
+
+Every export is parsed, analyzed and turned into a PDF report plus a JSON
+stats file, with several exports processed concurrently in worker processes:
+
+    python batch.py exports/ --output-dir reports/ --jobs 8
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import cache
+import helper
+import pdf_utils
+import preprocessor
+
+# Worker processes used when --jobs is not given
+BATCH_WORKERS = int(os.environ.get('ECHOMIND_BATCH_WORKERS', str(os.cpu_count() or 1)))
+
+# Number of top words / emojis stored in the stats file
+TOP_ITEMS = 20
+
+SUMMARY_NAME = 'batch_summary.json'
+
+
+def find_exports(inputs, recursive=False):
+    """Return (export path, output name) pairs for the given files and directories."""
+    found = []
+    for item in inputs:
+        if os.path.isdir(item):
+            pattern = os.path.join(item, '**', '*.txt') if recursive else os.path.join(item, '*.txt')
+            for path in sorted(glob.glob(pattern, recursive=recursive)):
+                found.append((path, os.path.splitext(os.path.relpath(path, item))[0]))
+        else:
+            found.append((item, os.path.splitext(os.path.basename(item))[0]))
+    return found
+
+
+def _user_summary(index, user):
+    messages, words, media, links = index.stats(user)
+    weekday = index.weekday_counts(user)
+    month = index.month_counts(user)
+    return {
+        'messages': messages,
+        'words': words,
+        'media': media,
+        'links': links,
+        'busiest_day': str(weekday.idxmax()) if len(weekday) else None,
+        'busiest_month': str(month.idxmax()) if len(month) else None,
+        'top_words': index.words(user).most_common(TOP_ITEMS),
+        'top_emojis': index.emojis(user).most_common(TOP_ITEMS),
+    }
+
+
+def chat_stats(df):
+    """Collect the headline statistics of a parsed chat as a JSON-serializable dict."""
+    index = helper.build_index(df)
+    dates = df['date'].dropna()
+    users = [user for user in index.user_counts.index.astype(str) if user != 'group_notification']
+    return {
+        'first_message': dates.min().isoformat() if len(dates) else None,
+        'last_message': dates.max().isoformat() if len(dates) else None,
+        'overall': _user_summary(index, 'Overall'),
+        'users': {user: _user_summary(index, user) for user in users},
+    }
+
+
+def analyze_export(path, name, output_dir, pdf=True):
+    """Analyze one export and write ``<name>.json`` (and ``<name>.pdf``) under ``output_dir``."""
+    start = time.perf_counter()
+    target = os.path.join(output_dir, name)
+    os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+    try:
+        df = preprocessor.preprocess_file(path)
+        if df['date'].isnull().all():
+            raise ValueError('no message with a valid date; not a supported chat export')
+        stats = chat_stats(df)
+        stats['source'] = path
+        if pdf:
+            report = pdf_utils.create_pdf_report(df, 'Overall', *helper.fetch_stats('Overall', df),
+                                                 chart_workers=1)
+            with open(target + '.pdf.tmp', 'wb') as f:
+                f.write(report.getbuffer())
+            os.replace(target + '.pdf.tmp', target + '.pdf')
+        with open(target + '.json.tmp', 'w', encoding='utf-8') as f:
+            json.dump(stats, f, ensure_ascii=False, indent=2)
+        os.replace(target + '.json.tmp', target + '.json')
+    finally:
+        # Results are not shared between exports, so keep worker memory flat
+        cache.results.clear()
+    return {'source': path, 'output': target, 'messages': stats['overall']['messages'],
+            'seconds': round(time.perf_counter() - start, 3)}
+
+
+def _is_current(path, name, output_dir, pdf):
+    """True when the outputs of ``path`` exist and are newer than the export."""
+    target = os.path.join(output_dir, name)
+    outputs = [target + '.json'] + ([target + '.pdf'] if pdf else [])
+    try:
+        source_mtime = os.path.getmtime(path)
+        return all(os.path.getmtime(output) >= source_mtime for output in outputs)
+    except OSError:
+        return False
+
+
+class Progress:
+    """Completion counter printed to stderr; redraws one line on a terminal."""
+
+    def __init__(self, total, quiet=False, stream=sys.stderr):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.quiet = quiet
+        self.stream = stream
+        self.interactive = stream.isatty()
+        self.start = time.perf_counter()
+
+    def update(self, path, error=None):
+        self.done += 1
+        if error is not None:
+            self.failed += 1
+        if self.quiet and error is None:
+            return
+        elapsed = time.perf_counter() - self.start
+        remaining = elapsed / self.done * (self.total - self.done)
+        status = f'[{self.done}/{self.total}] {self.failed} failed, {elapsed:.0f}s elapsed, ~{remaining:.0f}s left'
+        if error is not None:
+            self._clear()
+            print(f'FAILED {path}: {error}', file=self.stream)
+        if self.interactive:
+            self.stream.write('\r' + status[:120].ljust(120))
+            self.stream.flush()
+        else:
+            print(f'{status}  {path}', file=self.stream)
+
+    def _clear(self):
+        if self.interactive:
+            self.stream.write('\r' + ' ' * 120 + '\r')
+
+    def close(self):
+        if self.interactive and self.done:
+            self.stream.write('\n')
+            self.stream.flush()
+
+
+def run_batch(exports, output_dir, jobs=BATCH_WORKERS, pdf=True, progress=None):
+    """Analyze ``exports`` (from find_exports) with at most ``jobs`` worker processes.
+
+    Returns one result dict per export, with an ``error`` entry for failures.
+    """
+    results = []
+    if jobs <= 1:
+        for path, name in exports:
+            try:
+                results.append(analyze_export(path, name, output_dir, pdf))
+                error = None
+            except Exception as e:
+                error = f'{type(e).__name__}: {e}'
+                results.append({'source': path, 'error': error})
+            if progress:
+                progress.update(path, error)
+        return results
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = {}
+        queue = iter(exports)
+        # Keep only a couple of exports per worker in flight instead of queueing thousands
+        while True:
+            for path, name in queue:
+                pending[pool.submit(analyze_export, path, name, output_dir, pdf)] = path
+                if len(pending) >= jobs * 2:
+                    break
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                try:
+                    results.append(future.result())
+                    error = None
+                except Exception as e:
+                    error = f'{type(e).__name__}: {e}'
+                    results.append({'source': path, 'error': error})
+                if progress:
+                    progress.update(path, error)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Analyze WhatsApp chat exports and write PDF reports and JSON stats.')
+    parser.add_argument('inputs', nargs='+', help='export .txt files or directories containing them')
+    parser.add_argument('-o', '--output-dir', default='reports', help='where reports and stats are written')
+    parser.add_argument('-j', '--jobs', type=int, default=BATCH_WORKERS, help='exports analyzed concurrently')
+    parser.add_argument('-r', '--recursive', action='store_true', help='also search subdirectories')
+    parser.add_argument('--no-pdf', action='store_true', help='only write the JSON stats')
+    parser.add_argument('--force', action='store_true', help='reprocess exports whose outputs are up to date')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only report failures')
+    args = parser.parse_args(argv)
+
+    pdf = not args.no_pdf
+    exports = find_exports(args.inputs, args.recursive)
+    if not args.force:
+        exports = [(path, name) for path, name in exports
+                   if not _is_current(path, name, args.output_dir, pdf)]
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    progress = Progress(len(exports), quiet=args.quiet)
+    results = run_batch(exports, args.output_dir, max(1, args.jobs), pdf, progress)
+    progress.close()
+
+    failed = sum('error' in result for result in results)
+    with open(os.path.join(args.output_dir, SUMMARY_NAME), 'w', encoding='utf-8') as f:
+        json.dump({'processed': len(results), 'failed': failed, 'results': results}, f, indent=2)
+    if not args.quiet:
+        print(f'{len(results) - failed} of {len(results)} exports analyzed in '
+              f'{time.perf_counter() - progress.start:.1f}s -> {args.output_dir}', file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
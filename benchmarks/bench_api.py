@@ -0,0 +1,119 @@
+"""Load-test the HTTP API: concurrent uploads, end-to-end job latency and throughput.
+
+Starts ``api.py`` on a free local port unless --url points at a running server.
+
+Usage:
+    python benchmarks/bench_api.py --jobs 50 --concurrency 8 --messages 20000
+    python benchmarks/bench_api.py --url http://127.0.0.1:8000 --no-pdf
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from chatgen import make_chat
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(url + '/health', timeout=2):
+                return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    raise RuntimeError(f'server at {url} did not start')
+
+
+def run_job(url, data, pdf):
+    """Upload one chat and read its result stream; returns (latency, time to first section, sections)."""
+    start = time.perf_counter()
+    while True:
+        request = urllib.request.Request(f'{url}/jobs?pdf={int(pdf)}', data=data, method='POST',
+                                         headers={'Content-Type': 'text/plain'})
+        try:
+            with urllib.request.urlopen(request) as response:
+                job_id = json.load(response)['job_id']
+            break
+        except urllib.error.HTTPError as e:
+            if e.code != 503:
+                raise
+            time.sleep(float(e.headers.get('Retry-After', '1')))
+
+    first = None
+    sections = 0
+    with urllib.request.urlopen(f'{url}/jobs/{job_id}/stream') as response:
+        for line in response:
+            event = json.loads(line)
+            if 'section' in event:
+                sections += 1
+                if first is None:
+                    first = time.perf_counter() - start
+            elif event['status'] != 'done':
+                raise RuntimeError(f'job {job_id} failed: {event["error"]}')
+    return time.perf_counter() - start, first, sections
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='existing server; by default one is started locally')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='pool size of the started server')
+    parser.add_argument('--jobs', type=int, default=20, help='uploads in total')
+    parser.add_argument('--concurrency', type=int, default=4, help='uploads in flight at once')
+    parser.add_argument('--messages', type=int, default=20000, help='messages per uploaded chat')
+    parser.add_argument('--distinct', type=int, default=4, help='distinct chats uploaded round-robin')
+    parser.add_argument('--no-pdf', action='store_true', help='skip PDF rendering')
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        port = _free_port()
+        url = f'http://127.0.0.1:{port}'
+        server = subprocess.Popen([sys.executable, os.path.join(ROOT, 'api.py'), '--port', str(port),
+                                   '--workers', str(args.workers)], cwd=ROOT,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_ready(url)
+        chats = [make_chat(args.messages, seed=seed).encode('utf-8') for seed in range(args.distinct)]
+        print(f'{args.jobs} jobs, {args.concurrency} concurrent, {args.messages:,} messages each, '
+              f'pdf={"off" if args.no_pdf else "on"}')
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            results = list(pool.map(lambda i: run_job(url, chats[i % len(chats)], not args.no_pdf),
+                                    range(args.jobs)))
+        elapsed = time.perf_counter() - start
+
+        latencies = sorted(result[0] for result in results)
+        firsts = sorted(result[1] for result in results)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(f'throughput  {args.jobs / elapsed:8.2f} jobs/s  ({args.jobs * args.messages / elapsed:,.0f} msg/s)')
+        print(f'latency     p50 {statistics.median(latencies):.3f}s  p95 {p95:.3f}s  max {latencies[-1]:.3f}s')
+        print(f'first data  p50 {statistics.median(firsts):.3f}s')
+        with urllib.request.urlopen(url + '/health') as response:
+            print('server     ', json.load(response))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
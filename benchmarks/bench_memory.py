@@ -0,0 +1,52 @@
+"""Compare per-row memory of the preprocessed DataFrame before and after compact dtypes.
+
+Usage:
+    python benchmarks/bench_memory.py --messages 200000
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import preprocessor
+from chatgen import make_chat
+
+
+def legacy_dtypes(df):
+    """The column types preprocess produced before compact dtypes."""
+    df = df.copy()
+    for column in ['user', 'message', 'month', 'day_name', 'period']:
+        df[column] = df[column].astype(object)
+    for column in preprocessor.INT_COLUMNS:
+        df[column] = df[column].astype('int64')
+    df['only_date'] = df['date'].dt.date
+    return df
+
+
+def bytes_per_row(df):
+    return df.memory_usage(deep=True, index=False).sum() / max(len(df), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=200000)
+    args = parser.parse_args()
+
+    data = make_chat(args.messages)
+    compact = preprocessor.preprocess(data)
+    arrow = preprocessor.compact_dtypes(compact.copy(), arrow_strings=True)
+    legacy = legacy_dtypes(compact)
+
+    print(f'{len(compact):,} messages')
+    print(f'{"column":<12}{"before":>12}{"after":>12}')
+    before = legacy.memory_usage(deep=True, index=False) / len(legacy)
+    after = compact.memory_usage(deep=True, index=False) / len(compact)
+    for column in compact.columns:
+        print(f'{column:<12}{before[column]:12.1f}{after[column]:12.1f}')
+    print(f'{"total":<12}{bytes_per_row(legacy):12.1f}{bytes_per_row(compact):12.1f}  bytes/row')
+    print(f'with Arrow-backed message text: {bytes_per_row(arrow):.1f} bytes/row')
+
+
+if __name__ == '__main__':
+    main()
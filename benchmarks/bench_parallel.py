@@ -0,0 +1,45 @@
+"""Benchmark parallel preprocessing throughput from 1 to N worker processes.
+
+Usage:
+    python benchmarks/bench_parallel.py --messages 1000000 --max-workers 8
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import preprocessor
+from chatgen import make_chat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=500000)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    data = make_chat(args.messages)
+    print(f'{args.messages:,} messages, {len(data) / 1e6:.1f} MB of text')
+
+    start = time.perf_counter()
+    serial = preprocessor.preprocess(data)
+    baseline = time.perf_counter() - start
+    print(f'serial      {baseline:8.3f}s  {args.messages / baseline:12,.0f} msg/s')
+
+    workers = 2
+    while workers <= args.max_workers:
+        start = time.perf_counter()
+        df = preprocessor.preprocess_parallel(data, workers)
+        elapsed = time.perf_counter() - start
+        pd.testing.assert_frame_equal(serial, df)
+        print(f'{workers:2d} workers  {elapsed:8.3f}s  {args.messages / elapsed:12,.0f} msg/s  '
+              f'{baseline / elapsed:5.2f}x')
+        workers *= 2
+
+
+if __name__ == '__main__':
+    main()
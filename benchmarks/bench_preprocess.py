@@ -0,0 +1,95 @@
+"""Benchmark preprocessor.preprocess against the original regex-split parser.
+
+Usage:
+    python benchmarks/bench_preprocess.py --messages 100000
+"""
+import argparse
+import os
+import re
+import sys
+import time
+import warnings
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import preprocessor
+from chatgen import make_chat
+
+
+def legacy_preprocess(data):
+    """The parser preprocessor.preprocess used before the single-pass engine."""
+    pattern = r'((?:\d{1,2}[\/\-]){2}\d{2,4}),?\s\d{1,2}:\d{2}(?:\s?[APMapm]{2})?\s-\s'
+
+    messages = re.split(pattern, data)[1:]
+    dates = messages[::2]
+    messages = messages[1::2]
+
+    df = pd.DataFrame({'user_message': messages, 'message_date': dates})
+    df['message_date'] = df['message_date'].astype(str).str.strip()
+
+    def try_parse_date(s):
+        for fmt in [
+            '%d/%m/%Y, %H:%M', '%d/%m/%y, %H:%M', '%d-%m-%Y, %H:%M', '%d-%m-%y, %H:%M',
+            '%d/%m/%Y, %I:%M %p', '%d/%m/%y, %I:%M %p', '%d-%m-%Y, %I:%M %p', '%d-%m-%y, %I:%M %p',
+            '%m/%d/%Y, %H:%M', '%m/%d/%y, %H:%M', '%m-%d-%Y, %H:%M', '%m-%d-%y, %H:%M',
+            '%m/%d/%Y, %I:%M %p', '%m/%d/%y, %I:%M %p', '%m-%d-%Y, %I:%M %p', '%m-%d-%y, %I:%M %p',
+        ]:
+            try:
+                return pd.to_datetime(s, format=fmt)
+            except Exception:
+                continue
+        try:
+            return pd.to_datetime(s, errors='coerce')
+        except Exception:
+            return pd.NaT
+    df['message_date'] = df['message_date'].apply(try_parse_date)
+
+    df.rename(columns={'message_date': 'date'}, inplace=True)
+
+    users = []
+    messages = []
+    for message in df['user_message']:
+        entry = re.split(r'([\w\W]+?):\s', message)
+        if entry[1:]:
+            users.append(entry[1])
+            messages.append(" ".join(entry[2:]))
+        else:
+            users.append('group_notification')
+            messages.append(entry[0])
+
+    df['user'] = users
+    df['message'] = messages
+    df.drop(columns=['user_message'], inplace=True)
+    return preprocessor.add_time_features(df)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--skip-legacy', action='store_true', help='only time the current parser')
+    args = parser.parse_args()
+
+    data = make_chat(args.messages)
+    print(f'{args.messages:,} messages, {len(data) / 1e6:.1f} MB of text')
+
+    elapsed, df = timed(preprocessor.preprocess, data)
+    print(f'preprocess:        {elapsed:8.3f}s  ({len(df):,} rows)')
+
+    if not args.skip_legacy:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            elapsed_legacy, legacy_df = timed(legacy_preprocess, data)
+        print(f'legacy preprocess: {elapsed_legacy:8.3f}s  ({len(legacy_df):,} rows)')
+        print(f'speedup:           {elapsed_legacy / elapsed:8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
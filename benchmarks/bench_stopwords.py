@@ -0,0 +1,55 @@
+"""Benchmark stop-word filtering: substring scan of the raw file vs the set-based tokenizer.
+
+Usage:
+    python benchmarks/bench_stopwords.py --messages 100000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import helper
+import preprocessor
+from chatgen import make_chat
+
+
+def legacy_filter(messages):
+    """Token filter used by most_common_words before the stop-word lexicon."""
+    with open(helper.STOP_WORDS_PATH, 'r') as f:
+        stop_words = f.read()
+    words = []
+    for message in messages:
+        for word in message.lower().split():
+            if word not in stop_words:
+                words.append(word)
+    return words
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=100000)
+    args = parser.parse_args()
+
+    df = preprocessor.preprocess(make_chat(args.messages))
+    messages = helper.content_messages(df)
+    num_tokens = int(messages.str.split().str.len().sum())
+    print(f'{len(messages):,} messages, {num_tokens:,} tokens')
+
+    start = time.perf_counter()
+    legacy = legacy_filter(messages)
+    legacy_elapsed = time.perf_counter() - start
+
+    helper.load_stop_words()
+    start = time.perf_counter()
+    tokens = helper.tokenize(messages)
+    elapsed = time.perf_counter() - start
+
+    print(f'substring scan: {legacy_elapsed:7.3f}s  {legacy_elapsed / num_tokens * 1e9:8.1f} ns/token  ({len(legacy):,} kept)')
+    print(f'set lexicon:    {elapsed:7.3f}s  {elapsed / num_tokens * 1e9:8.1f} ns/token  ({len(tokens):,} kept)')
+    print(f'speedup:        {legacy_elapsed / elapsed:7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
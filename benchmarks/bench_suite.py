@@ -0,0 +1,195 @@
+"""Time every pipeline stage on synthetic chats and save the results for regression checks.
+
+Stages: parsing (in-memory and streamed), the analytics index, date range selection, every helper
+function, chart rendering and the PDF report, at each requested size. Each
+stage is run --repeat times and the fastest run is kept.
+
+Usage:
+    python benchmarks/bench_suite.py --sizes 10000,100000,1000000
+    python benchmarks/bench_suite.py --sizes 100000 --compare benchmarks/results/abc1234.json --threshold 0.15
+
+Results are saved to benchmarks/results/<commit>.json unless --save names another file.
+"""
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import warnings
+from collections import Counter
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import cache
+import helper
+import pdf_utils
+import preprocessor
+import sentiment
+import timeindex
+from chatgen import DEFAULT_DIALECT, make_chat, parse_dialect
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+HELPERS = ['fetch_stats', 'link_breakdown', 'monthly_timeline', 'daily_timeline', 'activity_timeline', 'week_activity_map',
+           'month_activity_map', 'activity_heatmap', 'most_common_words', 'emoji_helper', 'create_wordcloud',
+           'sentiment_timeline', 'daily_sentiment', 'sentiment_breakdown', 'sentiment_heatmap',
+           'conversation_stats', 'conversation_sessions', 'conversation_starters', 'response_times']
+
+
+def best_of(func, repeat, setup=None):
+    """Fastest of ``repeat`` runs of ``func()`` (``setup()`` runs untimed before each)."""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_size(num_messages, users, dialect, repeat, pdf=True):
+    counts = Counter()
+    text = make_chat(num_messages, users, dialect, counts=counts)
+    raw = text.encode('utf-8')
+    timings = {}
+
+    timings['parse'], df = best_of(lambda: preprocessor.preprocess(text), repeat)
+    timings['parse_stream'], _ = best_of(lambda: preprocessor.preprocess_stream(io.BytesIO(raw)), repeat)
+    if len(df) != counts['messages']:
+        raise AssertionError(f'parsed {len(df)} messages, generated {counts["messages"]}')
+
+    timings['index'], _ = best_of(lambda: helper.ChatIndex(df), repeat)
+    # The word and emoji counts are computed lazily on first use, so each run gets a fresh index
+    fresh = []
+    unscored = []
+    timings['index.word_counts'], _ = best_of(lambda: fresh[-1].word_counts, repeat,
+                                              setup=lambda: fresh.append(helper.ChatIndex(df)))
+    timings['index.emoji_counts'], _ = best_of(lambda: fresh[-1].emoji_counts, repeat,
+                                               setup=lambda: fresh.append(helper.ChatIndex(df)))
+    # Scoring from scratch: no sentiment column and an empty message-hash cache
+    timings['sentiment'], _ = best_of(lambda: sentiment.ensure_sentiment(unscored[-1], helper.content_messages(unscored[-1])), repeat,
+                                      setup=lambda: (sentiment.clear_cache(), unscored.clear(), unscored.append(df.copy())))
+    # The first run adds the sentiment column to df, so this times the per-bucket aggregation
+    timings['index.sentiment'], _ = best_of(lambda: fresh[-1].sentiment, repeat,
+                                            setup=lambda: fresh.append(helper.ChatIndex(df)))
+    timings['index.conversation'], _ = best_of(lambda: fresh[-1].conversation, repeat,
+                                               setup=lambda: fresh.append(helper.ChatIndex(df)))
+    del fresh, unscored
+    # Helpers are timed against a warm index, as they run in the app after the first section
+    index = helper.build_index(df)
+    index.word_counts, index.emoji_counts, index.sentiment, index.conversation
+    timings['most_busy_users'], _ = best_of(lambda: helper.most_busy_users(df), repeat)
+    timings['user_sentiment'], _ = best_of(lambda: helper.user_sentiment(df), repeat)
+    timings['user_response_times'], _ = best_of(lambda: helper.user_response_times(df), repeat)
+    timings['time_index'], time_index = best_of(lambda: timeindex.TimeIndex(df), repeat)
+    # The middle half of the chat, as selected by the app's date range slider
+    first, last = time_index.span()
+    start, end = first + (last - first) / 4, last - (last - first) / 4
+    timings['select_range'], _ = best_of(lambda: timeindex.select(df, start, end), repeat)
+    for name in HELPERS:
+        timings[name], _ = best_of(lambda: getattr(helper, name)('Overall', df), repeat)
+
+    if pdf:
+        timings['charts'], _ = best_of(
+            lambda: pdf_utils.create_visualization_charts(df, 'Overall', helper, workers=1, use_cache=False), repeat)
+        stats = helper.fetch_stats('Overall', df)
+        timings['pdf_report'], report = best_of(
+            lambda: pdf_utils.create_pdf_report(df, 'Overall', *stats, chart_workers=1), repeat,
+            setup=cache.results.clear)
+
+    return {
+        'messages': num_messages,
+        'bytes': len(raw),
+        'seconds': {name: round(value, 6) for name, value in timings.items()},
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print per-stage ratios against ``baseline``; returns the regressions beyond ``threshold``."""
+    previous = {run['messages']: run['seconds'] for run in baseline['runs']}
+    regressions = []
+    print(f'\ncompared with {baseline["environment"].get("commit")} ({baseline["environment"]["timestamp"]})')
+    for run in results['runs']:
+        old = previous.get(run['messages'])
+        if old is None:
+            continue
+        for stage, seconds in run['seconds'].items():
+            if stage not in old or old[stage] <= 0:
+                continue
+            ratio = seconds / old[stage]
+            flag = ''
+            # Ignore sub-millisecond stages where timer noise dominates
+            if ratio > 1 + threshold and seconds > 0.001:
+                flag = '  REGRESSION'
+                regressions.append((run['messages'], stage, ratio))
+            print(f'{run["messages"]:>10,} {stage:<22} {old[stage]:9.4f}s -> {seconds:9.4f}s  {ratio:5.2f}x{flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000', help='comma-separated message counts')
+    parser.add_argument('--users', type=int, default=12)
+    parser.add_argument('--dialect', type=parse_dialect, default=DEFAULT_DIALECT)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-pdf', action='store_true', help='skip chart and PDF rendering')
+    parser.add_argument('--save', help='write the results to this JSON file (default: results/<commit>.json)')
+    parser.add_argument('--no-save', action='store_true', help='do not write the results')
+    parser.add_argument('--compare', help='baseline JSON file from an earlier --save')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='slowdown ratio above which a stage counts as a regression')
+    args = parser.parse_args()
+    # Chart fonts lack emoji glyphs; the warnings say nothing about performance
+    warnings.filterwarnings('ignore', message='Glyph')
+
+    results = {'environment': environment(), 'users': args.users, 'dialect': list(args.dialect), 'runs': []}
+    for size in [int(s) for s in args.sizes.split(',')]:
+        run = bench_size(size, args.users, args.dialect, args.repeat, pdf=not args.no_pdf)
+        results['runs'].append(run)
+        print(f'\n{size:,} messages ({run["bytes"] / 1e6:.1f} MB)')
+        for stage, seconds in run['seconds'].items():
+            print(f'  {stage:<22} {seconds:9.4f}s  {size / seconds if seconds else 0:14,.0f} msg/s')
+
+    if not args.no_save:
+        path = args.save or os.path.join(RESULTS_DIR, f'{results["environment"]["commit"] or "local"}.json')
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f'\nsaved {path}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f'\n{len(regressions)} stage(s) slower than {1 + args.threshold:.2f}x the baseline')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""Synthetic WhatsApp exports covering every date dialect the parser supports.
+
+Exports mix plain, multi-line, emoji, link and media messages with group
+notifications, for any number of users, and are generated line by line so
+multi-million message chats can be written straight to disk.
+
+Usage:
+    python benchmarks/chatgen.py chat.txt --messages 1000000 --users 25 --dialect mdy-2-12-/
+    python benchmarks/chatgen.py samples/ --all-dialects --messages 5000
+"""
+import argparse
+import os
+import random
+from collections import Counter, namedtuple
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# order: 'dmy' or 'mdy'; year_digits: 2 or 4; clock: 12 or 24; sep: '/' or '-'
+Dialect = namedtuple('Dialect', ['order', 'year_digits', 'clock', 'sep'])
+
+DIALECTS = [Dialect(order, digits, clock, sep)
+            for order in ('dmy', 'mdy') for digits in (4, 2) for clock in (24, 12) for sep in ('/', '-')]
+
+DEFAULT_DIALECT = Dialect('dmy', 4, 24, '/')
+
+MEDIA_MESSAGE = '<Media omitted>'
+
+WORDS = [
+    'hello', 'ok', 'see', 'you', 'tomorrow', 'haha', 'yes', 'no', 'meeting', 'lunch', 'the', 'project',
+    'call', 'later', 'thanks', 'good', 'morning', 'night', 'where', 'are', 'what', 'time', 'done', 'sure',
+    'kya', 'hai', 'nahi', 'haan', 'acha', 'bhai', 'yaar', 'chalo', 'kal', 'aaj', 'theek', 'kaise', 'ho',
+]
+EMOJIS = [
+    '😂', '❤️', '👍', '🙏', '😊', '🔥', '🎉', '😭', '🤣', '😍',
+    '👍🏽', '👨‍👩‍👧', '🏳️‍🌈', '🇮🇳', '1️⃣', '#️⃣', '🧑🏻‍💻', '✌️',
+]
+LINKS = [
+    'https://example.com/page?id={n}', 'http://news.example.org/{n}', 'www.example.net/item/{n}',
+    'https://youtu.be/v{n}', 'docs.example.io/guide',
+]
+NOTIFICATIONS = [
+    'Messages and calls are end-to-end encrypted. No one outside of this chat, not even WhatsApp, can read or listen to them.',
+    '{user} created group "Weekend Plans"',
+    '{user} added {other}',
+    '{user} left',
+    '{user} changed the subject to "Team {n}"',
+    "{user} changed this group's icon",
+    '{user} changed their phone number to a new number. Tap to message or add the new number.',
+]
+
+
+def make_users(num_users, seed=0):
+    """User names in the shapes exports contain: names, phone numbers and names with emoji."""
+    rng = random.Random(seed)
+    users = []
+    for i in range(num_users):
+        kind = i % 5
+        if kind == 3:
+            users.append(f'+91 9{rng.randint(1000, 9999)} {rng.randint(10000, 99999)}')
+        elif kind == 4:
+            users.append(f'User {i} {EMOJIS[i % 10]}')
+        else:
+            users.append(f'User {i}')
+    return users
+
+
+def format_header(when, dialect, rng):
+    """Render the date/time prefix of one message in ``dialect``."""
+    day, month = when.day, when.month
+    year = when.year % 100 if dialect.year_digits == 2 else when.year
+    # Exports may or may not zero-pad day and month; vary it per message
+    pad = rng.random() < 0.5
+    first, second = (day, month) if dialect.order == 'dmy' else (month, day)
+    date = (f'{first:02d}{dialect.sep}{second:02d}' if pad else f'{first}{dialect.sep}{second}')
+    date += f'{dialect.sep}{year:02d}' if dialect.year_digits == 2 else f'{dialect.sep}{year}'
+    if dialect.clock == 24:
+        clock = f'{when.hour:02d}:{when.minute:02d}'
+    else:
+        hour = when.hour % 12 or 12
+        marker = 'AM' if when.hour < 12 else 'PM'
+        # Android writes "pm", iOS and newer Android builds a narrow no-break space before "PM"
+        spacing, marker = rng.choice([(' ', marker), (' ', marker.lower()), ('\u202f', marker)])
+        clock = f'{hour}:{when.minute:02d}{spacing}{marker}'
+    return f'{date}, {clock}'
+
+
+def _text(rng, n):
+    kind = rng.random()
+    if kind < 0.07:
+        return MEDIA_MESSAGE, 'media'
+    words = rng.choices(WORDS, k=rng.randint(1, 15))
+    if kind < 0.12:
+        words.insert(rng.randint(0, len(words)), rng.choice(LINKS).format(n=n))
+        category = 'link'
+    elif kind < 0.30:
+        words.insert(rng.randint(0, len(words)), ''.join(rng.choices(EMOJIS, k=rng.randint(1, 3))))
+        category = 'emoji'
+    elif kind < 0.32:
+        return 'This message was deleted', 'text'
+    else:
+        category = 'text'
+    text = ' '.join(words)
+    if rng.random() < 0.05:
+        # Multi-line message: continuation lines carry no header
+        extra = rng.randint(1, 3)
+        text += ''.join('\n' + ' '.join(rng.choices(WORDS, k=rng.randint(1, 8))) for _ in range(extra))
+        category = 'multiline' if category == 'text' else category
+    return text, category
+
+
+def iter_chat(num_messages, num_users=8, dialect=DEFAULT_DIALECT, seed=0,
+              start=datetime(2021, 1, 1), notification_rate=0.01, counts=None):
+    """Yield the lines of a synthetic export, one message (possibly multi-line) at a time.
+
+    When ``counts`` is a Counter it is filled with the number of generated
+    messages, notifications and each message category, and per-user totals
+    under ('user', name), so callers can check what a parser reads back.
+    """
+    rng = random.Random(seed)
+    # Header formatting draws from its own stream so every dialect gets the same messages
+    format_rng = random.Random(seed + 1)
+    users = make_users(num_users, seed)
+    # Skewed activity: a few users write most of the messages
+    weights = (1.0 / np.arange(1, num_users + 1)).tolist()
+    when = start
+    for n in range(num_messages):
+        when += timedelta(minutes=rng.choice([0, 1, 1, 2, 3, 5, 10, 30, 90, 600]))
+        header = format_header(when, dialect, format_rng)
+        if n == 0 or rng.random() < notification_rate:
+            user, other = rng.sample(users, 2) if num_users > 1 else (users[0], users[0])
+            line = f'{header} - ' + rng.choice(NOTIFICATIONS).format(user=user, other=other, n=n)
+            if counts is not None:
+                counts['messages'] += 1
+                counts['notification'] += 1
+            yield line + '\n'
+            continue
+        user = rng.choices(users, weights)[0]
+        text, category = _text(rng, n)
+        if counts is not None:
+            counts['messages'] += 1
+            counts[category] += 1
+            counts[('user', user)] += 1
+        yield f'{header} - {user}: {text}\n'
+
+
+def make_chat(num_messages, num_users=8, dialect=DEFAULT_DIALECT, seed=0, **kwargs):
+    """Return a synthetic export as one string (see iter_chat)."""
+    return ''.join(iter_chat(num_messages, num_users, dialect, seed, **kwargs))
+
+
+def write_chat(path, num_messages, num_users=8, dialect=DEFAULT_DIALECT, seed=0, **kwargs):
+    """Write a synthetic export to ``path`` in buffered batches; returns the generated counts."""
+    counts = Counter()
+    batch = []
+    with open(path, 'w', encoding='utf-8') as f:
+        for line in iter_chat(num_messages, num_users, dialect, seed, counts=counts, **kwargs):
+            batch.append(line)
+            if len(batch) >= 50000:
+                f.write(''.join(batch))
+                batch = []
+        f.write(''.join(batch))
+    return counts
+
+
+def parse_dialect(text):
+    """Parse 'dmy-4-24-/' style names (order-year digits-clock-separator)."""
+    order, digits, clock, sep = text.split('-', 3)
+    dialect = Dialect(order, int(digits), int(clock), sep)
+    if dialect not in DIALECTS:
+        raise argparse.ArgumentTypeError(f'unsupported dialect {text!r}')
+    return dialect
+
+
+def dialect_name(dialect):
+    return f'{dialect.order}-{dialect.year_digits}-{dialect.clock}-{dialect.sep}'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate synthetic WhatsApp chat exports.')
+    parser.add_argument('output', help='output file, or directory with --all-dialects')
+    parser.add_argument('--messages', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=8)
+    parser.add_argument('--dialect', type=parse_dialect, default=DEFAULT_DIALECT,
+                        help="order-yeardigits-clock-separator, e.g. 'mdy-2-12-/'")
+    parser.add_argument('--all-dialects', action='store_true', help='write one export per dialect')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.all_dialects:
+        os.makedirs(args.output, exist_ok=True)
+        targets = [(os.path.join(args.output, 'chat_' + dialect_name(d).replace('/', 'slash') + '.txt'), d)
+                   for d in DIALECTS]
+    else:
+        targets = [(args.output, args.dialect)]
+    for path, dialect in targets:
+        counts = write_chat(path, args.messages, args.users, dialect, args.seed)
+        print(f'{path}: {counts["messages"]:,} messages ({dialect_name(dialect)}), '
+              f'{counts["media"]:,} media, {counts["link"]:,} with links, {counts["notification"]:,} notifications')
+
+
+if __name__ == '__main__':
+    main()
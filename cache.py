@@ -0,0 +1,153 @@
+import hashlib
+import os
+import pickle
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# Memory budget of the in-process tier and optional directory of the on-disk tier
+DEFAULT_MAX_BYTES = int(os.environ.get('ECHOMIND_CACHE_MB', '512')) * 1024 * 1024
+DEFAULT_DISK_DIR = os.environ.get('ECHOMIND_CACHE_DIR') or None
+
+_MISSING = object()
+
+
+def content_key(data, block_size=1 << 20):
+    """Hash uploaded content (bytes or a binary file object) into a cache key."""
+    digest = hashlib.blake2b(digest_size=20)
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        digest.update(data)
+    else:
+        position = data.tell()
+        data.seek(0)
+        for block in iter(lambda: data.read(block_size), b''):
+            digest.update(block)
+        data.seek(position)
+    return digest.hexdigest()
+
+
+def _sizeof(value):
+    """Estimated memory footprint of ``value``, without serializing it."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(_sizeof(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_sizeof(k) + _sizeof(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """Two-tier LRU cache for analysis results.
+
+    The memory tier evicts least recently used entries once their estimated
+    size exceeds ``max_bytes``; when ``disk_dir`` is set, entries are also
+    pickled there so they survive restarts and memory evictions.
+
+    Values are returned by reference and shared by every session, so callers
+    must treat them as read-only: derived columns go on a copy, never on a
+    cached DataFrame itself.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, disk_dir=DEFAULT_DISK_DIR):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _disk_path(self, key):
+        name = hashlib.blake2b(repr(key).encode('utf-8'), digest_size=20).hexdigest()
+        return os.path.join(self.disk_dir, name + '.pkl')
+
+    def _store(self, key, value, size):
+        if key in self._entries:
+            self._size -= self._entries.pop(key)[1]
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, size)
+        self._size += size
+        while self._size > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._size -= evicted_size
+            self.evictions += 1
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        if self.disk_dir:
+            try:
+                with open(self._disk_path(key), 'rb') as f:
+                    payload = f.read()
+                value = pickle.loads(payload)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                pass
+            else:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._store(key, value, _sizeof(value))
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def put(self, key, value, disk=True):
+        """Store ``value``; with ``disk=False`` it is kept in memory only (e.g. per-session state)."""
+        if self.disk_dir and disk:
+            try:
+                payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+                path = self._disk_path(key)
+                with open(path + '.tmp', 'wb') as f:
+                    f.write(payload)
+                os.replace(path + '.tmp', path)
+            except (OSError, pickle.PicklingError, TypeError, AttributeError):
+                pass
+        size = _sizeof(value)
+        with self._lock:
+            self._store(key, value, size)
+
+    def get_or_compute(self, key, func):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = func()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'size_bytes': self._size,
+                'max_bytes': self.max_bytes,
+            }
+
+
+# Shared by every Streamlit rerun and session in this process
+results = ResultCache()
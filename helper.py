@@ -1,155 +1,742 @@
 from urlextract import URLExtract
-from wordcloud import WordCloud
+from wordcloud import WordCloud, STOPWORDS
 import pandas as pd
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import os
+import re
+import sys
+import weakref
 import emoji
+import numpy as np
+import preprocessor
+import profiling
+import sentiment
 
 extract = URLExtract()
 
-def fetch_stats(selected_user,df):
-
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
+MEDIA_MESSAGE = '<Media omitted>\n'
+
+# Words laid out in a word cloud unless a caller asks for another top-K
+WORDCLOUD_MAX_WORDS = 200
 
-    # fetch the number of messages
-    num_messages = df.shape[0]
+STOP_WORDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stop_hinglish.txt')
+
+# Every URL URLExtract can report has a scheme separator or a dot followed by a
+# TLD/IP component, so messages without either never reach the extractor.
+LINK_CANDIDATE_PATTERN = r'://|\.\w'
+
+# Worker processes used for link extraction (1 keeps it in-process) and the
+# number of candidate messages below which a pool is not worth starting.
+LINK_WORKERS = int(os.environ.get('ECHOMIND_LINK_WORKERS', '1'))
+LINK_POOL_THRESHOLD = 5000
+
+# Points the activity timeline is downsampled to: about two per horizontal pixel
+# of a full-width chart, beyond which the browser draws nothing more
+TIMELINE_MAX_POINTS = int(os.environ.get('ECHOMIND_TIMELINE_POINTS', '2000'))
+
+# A silence longer than this ends a conversation session
+SESSION_GAP_MINUTES = float(os.environ.get('ECHOMIND_SESSION_GAP_MINUTES', '60'))
+
+
+@lru_cache(maxsize=None)
+def load_stop_words(path=STOP_WORDS_PATH):
+    """Read a stop-word list once into a lower-cased frozenset."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return frozenset(word.strip().lower() for word in f.read().split())
+
+
+def content_messages(df):
+    """Messages that carry text written by a user (no notifications or media placeholders)."""
+    return df.loc[(df['user'] != 'group_notification') & (df['message'] != MEDIA_MESSAGE), 'message']
+
+
+def tokenize(messages, stop_words=None):
+    """Lower-case, split and stop-word filter a message column in one vectorized pass.
+
+    Returns a Series of tokens whose index repeats the index of the message
+    each token came from, so tokens can be grouped back by user.
+    """
+    if stop_words is None:
+        stop_words = load_stop_words()
+    tokens = messages.str.lower().str.split().explode().dropna()
+    return tokens[~tokens.isin(stop_words)]
+
+
+@lru_cache(maxsize=None)
+def emoji_matcher():
+    """Precompiled emoji matcher built from the emoji package's database.
+
+    Returns ``(run_pattern, sequences, longest)``: a regex over the code point
+    blocks emoji are drawn from (plus an optional keycap base), the set of
+    every known emoji sequence and the length of the longest one. Ranges of
+    neighbouring code points are merged so the character class stays a
+    handful of range checks.
+    """
+    sequences = frozenset(emoji.EMOJI_DATA)
+    ranges = []
+    for cp in sorted({ord(c) for sequence in sequences for c in sequence if ord(c) > 127}):
+        if ranges and cp <= ranges[-1][1] + 256:
+            ranges[-1][1] = cp
+        else:
+            ranges.append([cp, cp])
+    char_class = ''.join(re.escape(chr(lo)) + ('-' + re.escape(chr(hi)) if hi != lo else '') for lo, hi in ranges)
+    run_pattern = re.compile('[#*0-9]?[' + char_class + ']+')
+    return run_pattern, sequences, max(map(len, sequences))
+
+
+def _split_emoji_run(run):
+    """Greedily cut a run of emoji code points into the longest known sequences."""
+    _, sequences, longest = emoji_matcher()
+    found = []
+    i = 0
+    while i < len(run):
+        for j in range(min(len(run), i + longest), i, -1):
+            if run[i:j] in sequences:
+                found.append(run[i:j])
+                i = j
+                break
+        else:
+            i += 1
+    return found
+
+
+def extract_emojis(messages):
+    """Find complete emoji sequences (ZWJ, skin tones, flags, keycaps) in a message column.
+
+    Only messages with non-ASCII text are scanned, each distinct run of emoji
+    code points is split once, and the result is a Series of emoji whose
+    index repeats the index of the message each one came from, like tokenize().
+    """
+    run_pattern = emoji_matcher()[0]
+    candidates = messages[messages.str.contains(r'[^\x00-\x7f]', regex=True).fillna(False).astype(bool)]
+    runs = candidates.str.findall(run_pattern).explode().dropna()
+    pieces = {run: _split_emoji_run(run) for run in runs.unique()}
+    return runs.map(pieces).explode().dropna()
+
+
+def _count_urls(messages):
+    return [len(extract.find_urls(message)) for message in messages]
+
+
+@profiling.timed()
+def count_links(messages, workers=None):
+    """Count the URLs in every message of a column, returning an int64 array.
+
+    A vectorized regex prefilter picks the messages that could contain a link
+    and only those go through URLExtract, optionally spread over ``workers``
+    processes.
+    """
+    if workers is None:
+        workers = LINK_WORKERS
+    counts = np.zeros(len(messages), dtype=np.int64)
+    candidates = messages.str.contains(LINK_CANDIDATE_PATTERN, regex=True).to_numpy(dtype=bool, na_value=False)
+    positions = np.flatnonzero(candidates)
+    if len(positions) == 0:
+        return counts
+
+    texts = messages.iloc[positions].tolist()
+    if workers > 1 and len(texts) >= LINK_POOL_THRESHOLD:
+        batch = -(-len(texts) // (workers * 4))
+        batches = [texts[i:i + batch] for i in range(0, len(texts), batch)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            found = [n for result in pool.map(_count_urls, batches) for n in result]
+    else:
+        found = _count_urls(texts)
+    counts[positions] = found
+    return counts
+
+
+def conversation_tables(df, gap_minutes=None):
+    """Sessions and reply latencies of a chat, from one pass over its time-sorted messages.
+
+    Consecutive messages less than ``gap_minutes`` apart belong to the same
+    session; a message from a different user than the previous one in the
+    same session is a reply to that user. Returns a dict of DataFrames:
+    'sessions' (one row per session), 'members' (session, user pairs),
+    'replies' (one row per reply), 'pairs' (reply latency per responder
+    and replied-to user) and 'responders' (reply latency per responder).
+    """
+    if gap_minutes is None:
+        gap_minutes = SESSION_GAP_MINUTES
+    chat = df.loc[(df['user'] != 'group_notification') & df['date'].notna(), ['date', 'user']]
+    if not chat['date'].is_monotonic_increasing:
+        chat = chat.sort_values('date', kind='stable')
+    codes, names = pd.factorize(chat['user'])
+    names = np.asarray(names.astype(str), dtype=object)
+    dates = chat['date'].to_numpy()
+
+    minutes = np.diff(dates) / np.timedelta64(1, 'm')
+    new_session = np.concatenate([[True], minutes > gap_minutes]) if len(dates) else np.zeros(0, dtype=bool)
+    session = np.cumsum(new_session) - 1
+    previous = np.concatenate([[-1], codes[:-1]])
+    is_reply = ~new_session & (codes != previous)
+    latency = np.concatenate([[0.0], minutes])[is_reply]
+
+    starts = np.flatnonzero(new_session)
+    ends = np.concatenate([starts[1:], [len(dates)]])[:len(starts)] - 1
+    # Each (session, user) pair once, found by hashing rather than sorting
+    keys = pd.unique(session.astype(np.int64) * max(len(names), 1) + codes)
+    member_sessions, member_users = np.divmod(keys, max(len(names), 1))
+    sessions = pd.DataFrame({
+        'start': dates[starts],
+        'end': dates[ends],
+        'duration_minutes': (dates[ends] - dates[starts]) / np.timedelta64(1, 'm'),
+        'messages': ends - starts + 1,
+        'participants': np.bincount(member_sessions, minlength=len(starts)),
+        'starter': names[codes[starts]],
+    })
+    members = pd.DataFrame({'session': member_sessions, 'user': names[member_users]})
+
+    replies = pd.DataFrame({'user': names[codes[is_reply]], 'replied_to': names[previous[is_reply]],
+                            'minutes': latency})
+    pairs = (replies.groupby(['user', 'replied_to'], sort=False)['minutes']
+             .agg(replies='size', median_minutes='median', mean_minutes='mean')
+             .reset_index().sort_values('replies', ascending=False, kind='stable', ignore_index=True))
+    responders = (replies.groupby('user', sort=False)['minutes']
+                  .agg(replies='size', median_minutes='median', mean_minutes='mean')
+                  .sort_values('replies', ascending=False, kind='stable'))
+    return {'sessions': sessions, 'members': members, 'replies': replies, 'pairs': pairs, 'responders': responders}
+
+
+# Calendar columns the index groups by (computed on demand for lazily preprocessed chats)
+INDEX_TIME_FEATURES = ['only_date', 'year', 'month_num', 'month', 'day_name', 'period']
+
+
+class ChatIndex:
+    """Per-user aggregates of a preprocessed chat, built once per upload.
+
+    Every bucket table maps a user (and 'Overall', the sum over all users) to
+    a pre-grouped count Series, so switching the selected user is a dict
+    lookup instead of a rescan of the messages.
+    """
+
+    @profiling.timed('helper.ChatIndex')
+    def __init__(self, df, row_counts=None):
+        """``row_counts`` can pass the per-message counts of ``df`` (see row_counts) when already known."""
+        source = df
+        # The chat may be shared (e.g. a cache.results value), so missing calendar columns go on a copy
+        df = preprocessor.ensure_time_features(df.copy(deep=False), INDEX_TIME_FEATURES)
+        if row_counts is None:
+            row_counts = self._count_rows(df)
+        self._row_counts = row_counts
+        per_message = row_counts.astype('int64').assign(user=df['user'], messages=1)
+        totals = per_message.groupby('user', sort=False, observed=True)[['messages', 'words', 'media', 'links']].sum()
+        totals.index = totals.index.astype(str)
+        totals.loc['Overall'] = totals.sum()
+        self.totals = totals
+        self.user_counts = df['user'].value_counts()
+
+        links = per_message.loc[per_message['links'] > 0, ['user', 'links']]
+        self.link_days = (links.groupby([links['user'], df['only_date'].loc[links.index]], sort=True, observed=True)['links']
+                          .sum().reset_index())
+
+        self.monthly = self._bucket_counts(df, ['year', 'month_num', 'month'])
+        self.daily = self._bucket_counts(df, ['only_date'])
+        self.weekday = self._bucket_counts(df, ['day_name'])
+        self.month = self._bucket_counts(df, ['month'])
+        self.heatmap = self._bucket_counts(df, ['day_name', 'period'])
+
+        # Word and emoji counts and sentiment aggregates are the expensive part and
+        # only needed by some sections, so they are computed on first use from the
+        # source frame.
+        self._source = weakref.ref(source)
+        self._word_counts = None
+        self._emoji_counts = None
+        self._sentiment = None
+        self._conversation = None
+
+    @staticmethod
+    def _count_rows(df):
+        messages = df['message']
+        if messages.empty:
+            # Nothing parsed (the column may not even hold strings)
+            return pd.DataFrame(0, index=df.index, columns=['words', 'media', 'links'], dtype='int32')
+        return pd.DataFrame({
+            'words': messages.str.split().str.len().fillna(0).astype('int32'),
+            'media': (messages == MEDIA_MESSAGE).astype('int32'),
+            'links': count_links(messages).astype('int32'),
+        }, index=df.index)
+
+    @property
+    def row_counts(self):
+        """Words, media and links of every message, aligned with the source frame.
+
+        Kept so that an index over a subset of the rows (see timeindex.select)
+        takes its counts from here instead of re-extracting links.
+        """
+        if self._row_counts is None:
+            self._row_counts = self._count_rows(self._chat())
+        return self._row_counts
+
+    @staticmethod
+    def _per_user_counts(values, users):
+        counts = values.groupby(users.loc[values.index].values, observed=True).value_counts()
+        table = {
+            user: Counter(dict(zip(group.index.get_level_values(-1), group.values.tolist())))
+            for user, group in counts.groupby(level=0, sort=False, observed=True)
+        }
+        table['Overall'] = sum(table.values(), Counter())
+        return table
+
+    def _chat(self):
+        df = self._source()
+        if df is None:
+            raise RuntimeError('the chat this index was built from is no longer available')
+        return df
+
+    @property
+    def word_counts(self):
+        if self._word_counts is None:
+            df = self._chat()
+            with profiling.stage('helper.ChatIndex.word_counts', rows=len(df)):
+                self._word_counts = self._per_user_counts(tokenize(content_messages(df)), df['user'])
+        return self._word_counts
+
+    @property
+    def emoji_counts(self):
+        if self._emoji_counts is None:
+            df = self._chat()
+            with profiling.stage('helper.ChatIndex.emoji_counts', rows=len(df)):
+                self._emoji_counts = self._per_user_counts(extract_emojis(df['message']), df['user'])
+        return self._emoji_counts
+
+    @property
+    def sentiment(self):
+        """Sentiment sum and scored-message count per user and bucket ('monthly', 'daily', 'heatmap', 'labels')."""
+        if self._sentiment is None:
+            df = self._chat()
+            with profiling.stage('helper.ChatIndex.sentiment', rows=len(df)):
+                # Scores are added to a copy of the scored rows, never to the (shared) chat itself
+                messages = content_messages(df)
+                scores = sentiment.score_messages(messages)
+                scored = df.loc[messages.index].assign(sentiment=scores, label=sentiment.labels(scores))
+                preprocessor.ensure_time_features(scored, INDEX_TIME_FEATURES)
+                self._sentiment = {
+                    'monthly': self._bucket_sums(scored, ['year', 'month_num', 'month']),
+                    'daily': self._bucket_sums(scored, ['only_date']),
+                    'heatmap': self._bucket_sums(scored, ['day_name', 'period']),
+                    'labels': self._bucket_sums(scored, ['label']),
+                }
+        return self._sentiment
+
+    @property
+    def conversation(self):
+        """Session and reply-latency tables (see conversation_tables)."""
+        if self._conversation is None:
+            df = self._chat()
+            with profiling.stage('helper.ChatIndex.conversation', rows=len(df)):
+                self._conversation = conversation_tables(df)
+        return self._conversation
+
+    @property
+    def nbytes(self):
+        """Rough memory footprint of the tables computed so far, for cache budgets (computes nothing)."""
+        def usage(table):
+            size = table.memory_usage()
+            return int(size.sum()) if isinstance(size, pd.Series) else int(size)
+
+        tables = [self.monthly, self.daily, self.weekday, self.month, self.heatmap]
+        if self._sentiment is not None:
+            tables.extend(self._sentiment.values())
+        size = sum(usage(series) for table in tables for series in table.values())
+        size += sum(usage(frame) for frame in (self.totals, self.user_counts, self.link_days, self._row_counts)
+                    if frame is not None)
+        for counts in (self._word_counts, self._emoji_counts):
+            if counts is not None:
+                size += sum(sys.getsizeof(counter) for counter in counts.values())
+        return size
+
+    def __getstate__(self):
+        # Weak references cannot be pickled, so materialize the lazy counts first.
+        # Sentiment and conversation tables are only kept if already computed:
+        # the sections that need them go through an index rebuilt for the frame.
+        state = self.__dict__.copy()
+        state['_word_counts'] = self.word_counts
+        state['_emoji_counts'] = self.emoji_counts
+        state['_source'] = None
+        # Per-message counts are as long as the chat; recomputed if ever needed again
+        state['_row_counts'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._source = lambda: None
+
+    @staticmethod
+    def _bucket_counts(df, keys):
+        counts = df.groupby(['user'] + keys, sort=True, observed=True).size()
+        table = {user: group.droplevel(0) for user, group in counts.groupby(level=0, sort=False, observed=True)}
+        table['Overall'] = counts.groupby(level=keys, sort=True, observed=True).sum()
+        return table
+
+    @staticmethod
+    def _bucket_sums(scored, keys):
+        sums = (scored.groupby(['user'] + keys, sort=True, observed=True)['sentiment']
+                .agg(['sum', 'count']).astype({'sum': 'float64'}))
+        table = {user: group.droplevel(0) for user, group in sums.groupby(level=0, sort=False, observed=True)}
+        table['Overall'] = sums.groupby(level=keys, sort=True, observed=True).sum()
+        return table
+
+    def combine(self, other):
+        """Return a new index covering the messages of both ``self`` and ``other``.
+
+        Used to fold the index of newly appended messages into the index of
+        the stored chat without rescanning it.
+        """
+        combined = object.__new__(ChatIndex)
+        combined.totals = self.totals.add(other.totals, fill_value=0).astype('int64')
+        combined.user_counts = (self.user_counts.add(other.user_counts, fill_value=0).astype('int64')
+                                .sort_values(ascending=False).rename('count').rename_axis('user'))
+        link_days = pd.concat([self.link_days, other.link_days], ignore_index=True)
+        combined.link_days = (link_days.groupby(['user', 'only_date'], sort=True, observed=True)['links']
+                              .sum().reset_index())
+        for name in ('monthly', 'daily', 'weekday', 'month', 'heatmap'):
+            setattr(combined, name, self._combine_tables(getattr(self, name), getattr(other, name)))
+        for name in ('word_counts', 'emoji_counts'):
+            mine, theirs = getattr(self, name), getattr(other, name)
+            setattr(combined, '_' + name, {user: mine.get(user, Counter()) + theirs.get(user, Counter())
+                                           for user in set(mine) | set(theirs)})
+        combined._row_counts = None
+        if self._row_counts is not None and other._row_counts is not None:
+            # Rows follow each other as in preprocessor.concat_frames
+            combined._row_counts = pd.concat([self._row_counts, other._row_counts], ignore_index=True)
+        combined._sentiment = None
+        if self._sentiment is not None and other._sentiment is not None:
+            combined._sentiment = {name: self._combine_tables(table, other._sentiment[name])
+                                   for name, table in self._sentiment.items()}
+        # Sessions can span the boundary between the two chats, so they are
+        # recomputed from the combined frame when next needed
+        combined._conversation = None
+        # register_index() points the source at the combined frame for what is still lazy
+        combined._source = lambda: None
+        return combined
+
+    @staticmethod
+    def _combine_tables(mine, theirs):
+        table = {}
+        for user in set(mine) | set(theirs):
+            if user not in theirs:
+                table[user] = mine[user]
+            elif user not in mine:
+                table[user] = theirs[user]
+            else:
+                merged = pd.concat([mine[user], theirs[user]])
+                table[user] = merged.groupby(level=list(range(merged.index.nlevels)),
+                                             sort=True, observed=True).sum()
+        return table
+
+    @staticmethod
+    def _lookup(table, selected_user):
+        if selected_user in table:
+            return table[selected_user]
+        return table['Overall'].iloc[:0]
+
+    def stats(self, selected_user):
+        if selected_user not in self.totals.index:
+            return 0, 0, 0, 0
+        row = self.totals.loc[selected_user]
+        return int(row['messages']), int(row['words']), int(row['media']), int(row['links'])
+
+    def monthly_counts(self, selected_user):
+        return self._lookup(self.monthly, selected_user)
+
+    def daily_counts(self, selected_user):
+        return self._lookup(self.daily, selected_user)
+
+    def weekday_counts(self, selected_user):
+        return self._lookup(self.weekday, selected_user)
+
+    def month_counts(self, selected_user):
+        return self._lookup(self.month, selected_user)
+
+    def heatmap_counts(self, selected_user):
+        return self._lookup(self.heatmap, selected_user)
+
+    def words(self, selected_user):
+        return self.word_counts.get(selected_user, Counter())
+
+    def emojis(self, selected_user):
+        return self.emoji_counts.get(selected_user, Counter())
+
+    def sentiment_sums(self, bucket, selected_user):
+        return self._lookup(self.sentiment[bucket], selected_user)
+
+
+# Indexes are keyed by the identity of the DataFrame they were built from and
+# dropped as soon as that DataFrame is garbage collected.
+_indexes = {}
+
+def build_index(df):
+    key = id(df)
+    entry = _indexes.get(key)
+    if entry is not None and entry[0]() is df:
+        return entry[1]
+
+    return register_index(df, ChatIndex(df))
+
+def register_index(df, index):
+    key = id(df)
+    if index._source() is None:
+        index._source = weakref.ref(df)
+    _indexes[key] = (weakref.ref(df, lambda _, key=key: _indexes.pop(key, None)), index)
+    return index
+
+@profiling.timed()
+def fetch_stats(selected_user,df):
 
-    # fetch the total number of words
-    words = []
-    for message in df['message']:
-        words.extend(message.split())
+    return build_index(df).stats(selected_user)
 
-    # fetch number of media messages
-    num_media_messages = df[df['message'] == '<Media omitted>\n'].shape[0]
+@profiling.timed()
+def link_breakdown(selected_user,df):
 
-    # fetch number of links shared
-    links = []
-    for message in df['message']:
-        links.extend(extract.find_urls(message))
+    link_days = build_index(df).link_days
+    if selected_user != 'Overall':
+        link_days = link_days[link_days['user'] == selected_user].reset_index(drop=True)
 
-    return num_messages,len(words),num_media_messages,len(links)
+    return link_days
 
+@profiling.timed()
 def most_busy_users(df):
-    x = df['user'].value_counts().head()
-    df = round((df['user'].value_counts() / df.shape[0]) * 100, 2).reset_index().rename(
+    counts = build_index(df).user_counts
+    x = counts.head()
+    df = round((counts / counts.sum()) * 100, 2).reset_index().rename(
         columns={'index': 'name', 'user': 'percent'})
     return x,df
 
-def create_wordcloud(selected_user,df):
+@profiling.timed()
+def create_wordcloud(selected_user,df,width=500,height=500,max_words=WORDCLOUD_MAX_WORDS):
 
-    f = open('stop_hinglish.txt', 'r')
-    stop_words = f.read()
+    # Lay out the top words straight from the index's frequency table (the one
+    # most_common_words uses) instead of re-tokenizing the joined messages
+    words = build_index(df).words(selected_user)
+    frequencies = dict(Counter({word: count for word, count in words.items()
+                                if word not in STOPWORDS}).most_common(max_words))
 
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
-
-    temp = df[df['user'] != 'group_notification']
-    temp = temp[temp['message'] != '<Media omitted>\n']
-
-    def remove_stop_words(message):
-        y = []
-        for word in message.lower().split():
-            if word not in stop_words:
-                y.append(word)
-        return " ".join(y)
-
-    wc = WordCloud(width=500,height=500,min_font_size=10,background_color='white')
-    temp['message'] = temp['message'].apply(remove_stop_words)
-    df_wc = wc.generate(temp['message'].str.cat(sep=" "))
+    wc = WordCloud(width=width,height=height,min_font_size=10,background_color='white',max_words=max_words)
+    df_wc = wc.generate_from_frequencies(frequencies)
     return df_wc
 
+@profiling.timed()
 def most_common_words(selected_user,df):
 
-    f = open('stop_hinglish.txt','r')
-    stop_words = f.read()
-
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
-
-    temp = df[df['user'] != 'group_notification']
-    temp = temp[temp['message'] != '<Media omitted>\n']
-
-    words = []
-
-    for message in temp['message']:
-        for word in message.lower().split():
-            if word not in stop_words:
-                words.append(word)
+    words = build_index(df).words(selected_user)
 
-    most_common_df = pd.DataFrame(Counter(words).most_common(20))
+    most_common_df = pd.DataFrame(words.most_common(20))
     return most_common_df
 
+@profiling.timed()
 def emoji_helper(selected_user,df):
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
 
-    emojis = []
-    for message in df['message']:
-        # Use emoji.is_emoji() for better emoji detection
-        emojis.extend([c for c in message if emoji.is_emoji(c)])
+    emojis = build_index(df).emojis(selected_user)
 
-    emoji_df = pd.DataFrame(Counter(emojis).most_common(len(Counter(emojis))))
+    emoji_df = pd.DataFrame(emojis.most_common(len(emojis)))
 
     return emoji_df
 
+@profiling.timed()
 def monthly_timeline(selected_user,df):
 
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
-
-    timeline = df.groupby(['year', 'month_num', 'month']).count()['message'].reset_index()
+    timeline = build_index(df).monthly_counts(selected_user).rename('message').reset_index()
 
-    time = []
-    for i in range(timeline.shape[0]):
-        time.append(timeline['month'][i] + "-" + str(timeline['year'][i]))
-
-    timeline['time'] = time
+    timeline['time'] = timeline['month'].astype(str) + "-" + timeline['year'].astype(str)
 
     return timeline
 
+@profiling.timed()
 def daily_timeline(selected_user,df):
 
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
-
-    daily_timeline = df.groupby('only_date').count()['message'].reset_index()
+    daily_timeline = build_index(df).daily_counts(selected_user).rename('message').reset_index()
 
     return daily_timeline
 
+# Period of each granularity of activity_timeline
+TIMELINE_FREQUENCIES = {'day': None, 'week': 'W-MON', 'month': 'MS'}
+
+def downsample_minmax(values, max_points):
+    """Positions of the lowest and highest value in each of about ``max_points / 2`` equal buckets, and the ends.
+
+    Peaks and troughs survive, so the downsampled line covers the same range as the full one.
+    """
+    n = len(values)
+    if n <= max_points:
+        return np.arange(n)
+    buckets = np.arange(n) * (max(max_points - 2, 2) // 2) // n
+    order = np.lexsort((values, buckets))
+    edges = np.flatnonzero(np.diff(buckets[order])) + 1
+    lows = order[np.concatenate([[0], edges])]
+    highs = order[np.concatenate([edges - 1, [n - 1]])]
+    return np.unique(np.concatenate([lows, highs, [0, n - 1]]))
+
+def downsample_lttb(x, y, max_points):
+    """Positions kept by Largest-Triangle-Three-Buckets: per bucket, the point
+    forming the largest triangle with the previous pick and the next bucket's mean."""
+    n = len(x)
+    if n <= max_points or max_points < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    edges = np.append(edges, n)
+    picked = np.empty(max_points, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    a = 0
+    for i in range(max_points - 2):
+        lo, hi, next_hi = edges[i], edges[i + 1], edges[i + 2]
+        mean_x, mean_y = x[hi:next_hi].mean(), y[hi:next_hi].mean()
+        area = np.abs((x[a] - mean_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (mean_y - y[a]))
+        a = lo + int(area.argmax())
+        picked[i + 1] = a
+    return picked
+
+@profiling.timed()
+def activity_timeline(selected_user,df,freq='day',max_points=TIMELINE_MAX_POINTS,method='minmax'):
+    """Messages per day, week or month, downsampled to at most ``max_points`` points.
+
+    Returns the (date, message) frame to plot and the number of points before downsampling.
+    ``method`` is 'minmax' (keeps every peak) or 'lttb' (keeps the visual shape).
+    """
+    counts = build_index(df).daily_counts(selected_user)
+    counts = counts.set_axis(pd.DatetimeIndex(counts.index.get_level_values('only_date'), name='date'))
+    if TIMELINE_FREQUENCIES[freq] is not None:
+        counts = counts.resample(TIMELINE_FREQUENCIES[freq], label='left', closed='left').sum()
+    timeline = counts.rename('message').reset_index()
+
+    total = len(timeline)
+    if method == 'lttb':
+        keep = downsample_lttb(timeline['date'].to_numpy().view('int64'), timeline['message'].to_numpy(), max_points)
+    else:
+        keep = downsample_minmax(timeline['message'].to_numpy(), max_points)
+    if len(keep) < total:
+        timeline = timeline.iloc[keep].reset_index(drop=True)
+    return timeline, total
+
+@profiling.timed()
 def week_activity_map(selected_user,df):
 
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
-
-    return df['day_name'].value_counts()
+    return build_index(df).weekday_counts(selected_user).sort_values(ascending=False).rename('count')
 
+@profiling.timed()
 def month_activity_map(selected_user,df):
 
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
-
-    return df['month'].value_counts()
+    return build_index(df).month_counts(selected_user).sort_values(ascending=False).rename('count')
 
+@profiling.timed()
 def activity_heatmap(selected_user,df):
 
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
-
-    user_heatmap = df.pivot_table(index='day_name', columns='period', values='message', aggfunc='count').fillna(0)
+    counts = build_index(df).heatmap_counts(selected_user)
+    user_heatmap = counts.unstack()
+    days, periods = counts.index.levels
+    if isinstance(days, pd.CategoricalIndex) and isinstance(periods, pd.CategoricalIndex):
+        # Keep the full Monday-Sunday x 24 hour grid in calendar order
+        user_heatmap = user_heatmap.reindex(index=days.categories, columns=periods.categories)
+    user_heatmap = user_heatmap.fillna(0)
 
     return user_heatmap
 
+def _mean_sentiment(sums):
+    return (sums['sum'] / sums['count']).rename('sentiment')
+
+@profiling.timed()
+def sentiment_timeline(selected_user,df):
 
+    sums = build_index(df).sentiment_sums('monthly', selected_user)
+    timeline = pd.concat([_mean_sentiment(sums), sums['count'].rename('message')], axis=1).reset_index()
 
+    timeline['time'] = timeline['month'].astype(str) + "-" + timeline['year'].astype(str)
 
+    return timeline
 
+@profiling.timed()
+def daily_sentiment(selected_user,df):
 
+    sums = build_index(df).sentiment_sums('daily', selected_user)
 
+    return pd.concat([_mean_sentiment(sums), sums['count'].rename('message')], axis=1).reset_index()
 
+@profiling.timed()
+def sentiment_breakdown(selected_user,df):
 
+    # Mean score and the number of positive / neutral / negative messages
+    sums = build_index(df).sentiment_sums('labels', selected_user)
+    counts = sums['count'].reindex(['positive', 'neutral', 'negative'], fill_value=0).rename('count')
+    mean = sums['sum'].sum() / counts.sum() if counts.sum() else 0.0
+    return mean,counts
 
+@profiling.timed()
+def user_sentiment(df):
+
+    labels = build_index(df).sentiment['labels']
+    rows = {}
+    for user, sums in labels.items():
+        if user in ('Overall', 'group_notification'):
+            continue
+        counts = sums['count'].reindex(['positive', 'neutral', 'negative'], fill_value=0)
+        total = counts.sum()
+        rows[user] = {'messages': total, 'sentiment': sums['sum'].sum() / total,
+                      **(counts / total * 100).round(2).to_dict()}
+    columns = ['messages', 'sentiment', 'positive', 'neutral', 'negative']
+    return pd.DataFrame.from_dict(rows, orient='index', columns=columns).rename_axis('user').sort_values(
+        'sentiment', ascending=False)
+
+@profiling.timed()
+def sentiment_heatmap(selected_user,df):
+
+    # Mean score per weekday and hour (NaN where nobody wrote)
+    sums = build_index(df).sentiment_sums('heatmap', selected_user)
+    user_heatmap = _mean_sentiment(sums).unstack()
+    days, periods = sums.index.levels
+    if isinstance(days, pd.CategoricalIndex) and isinstance(periods, pd.CategoricalIndex):
+        user_heatmap = user_heatmap.reindex(index=days.categories, columns=periods.categories)
+
+    return user_heatmap
 
+def _user_sessions(tables, selected_user):
+    sessions = tables['sessions']
+    if selected_user == 'Overall':
+        return sessions
+    members = tables['members']
+    return sessions.loc[members.loc[members['user'] == selected_user, 'session']]
 
+@profiling.timed()
+def conversation_stats(selected_user,df):
+
+    # Sessions, their median length (minutes and messages), the median reply time and sessions started
+    tables = build_index(df).conversation
+    sessions = _user_sessions(tables, selected_user)
+    replies = tables['replies']
+    if selected_user != 'Overall':
+        replies = replies[replies['user'] == selected_user]
+    started = len(sessions) if selected_user == 'Overall' else int((sessions['starter'] == selected_user).sum())
+    median = lambda values: float(values.median()) if len(values) else 0.0
+
+    return (len(sessions), median(sessions['duration_minutes']), median(sessions['messages']),
+            median(replies['minutes']), started)
+
+@profiling.timed()
+def conversation_sessions(selected_user,df):
+
+    return _user_sessions(build_index(df).conversation, selected_user).reset_index(drop=True)
+
+@profiling.timed()
+def conversation_starters(selected_user,df):
+
+    # Who opened the sessions the selected user took part in
+    starters = _user_sessions(build_index(df).conversation, selected_user)['starter']
+    return starters.value_counts().rename('sessions')
+
+@profiling.timed()
+def response_times(selected_user,df):
+
+    # Reply latency per (responder, replied-to user) pair
+    pairs = build_index(df).conversation['pairs']
+    if selected_user != 'Overall':
+        pairs = pairs[pairs['user'] == selected_user].reset_index(drop=True)
 
+    return pairs
 
+@profiling.timed()
+def user_response_times(df):
 
+    return build_index(df).conversation['responders']
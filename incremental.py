@@ -0,0 +1,158 @@
+"""Incremental re-analysis of re-exported chats.
+
+A ChatState remembers a parsed chat together with a fingerprint of the raw
+export it came from: the byte offset where its last message starts, a hash
+of every byte before that offset and the raw header line of that message.
+When the same chat is exported again, update() recognizes the stored prefix
+(by hash, or failing that by finding the last known message header), parses
+only the bytes from the last stored message onward, and folds the new
+messages into the stored DataFrame and analytics index.
+"""
+import hashlib
+from contextlib import closing
+
+import pandas as pd
+
+import helper
+import preprocessor
+import snapshot
+
+# Bytes read at a time when hashing and when searching the end of an export
+BLOCK_SIZE = 1 << 20
+
+
+class ChatState:
+    """A parsed chat plus the fingerprint of the export it was parsed from."""
+
+    def __init__(self, df, index, dialect, prefix_len, prefix_digest, anchor):
+        self.df = df
+        self.index = index
+        self.dialect = dialect
+        self.prefix_len = prefix_len
+        self.prefix_digest = prefix_digest
+        self.anchor = anchor
+
+    @property
+    def nbytes(self):
+        return int(self.df.memory_usage(deep=True).sum()) + self.index.nbytes
+
+    @classmethod
+    def from_file(cls, fileobj, df=None):
+        """Fingerprint the export in the binary file object ``fileobj``.
+
+        ``df`` is the already parsed chat when the caller has it; otherwise
+        the file is parsed here.
+        """
+        if df is None:
+            df = preprocessor.preprocess_stream(fileobj)
+        prefix_len, anchor = _last_header(fileobj)
+        return cls(df, helper.build_index(df), _file_dialect(fileobj), prefix_len,
+                   _digest(fileobj, prefix_len), anchor)
+
+
+def _size(fileobj):
+    fileobj.seek(0, 2)
+    return fileobj.tell()
+
+
+def _digest(fileobj, length):
+    """Hash the first ``length`` bytes of ``fileobj``."""
+    digest = hashlib.blake2b(digest_size=20)
+    fileobj.seek(0)
+    remaining = length
+    while remaining > 0:
+        block = fileobj.read(min(BLOCK_SIZE, remaining))
+        if not block:
+            break
+        digest.update(block)
+        remaining -= len(block)
+    return digest.hexdigest()
+
+
+def _file_dialect(fileobj):
+    """Detect the date dialect of the export, reading it only until the day/month order is settled."""
+    with closing(preprocessor.iter_lines(fileobj)) as lines:
+        return preprocessor.scan_dialect(lines)
+
+
+def _last_header(fileobj):
+    """Return (byte offset, raw header line) of the last message in the export."""
+    size = _size(fileobj)
+    window = BLOCK_SIZE
+    while True:
+        start = max(0, size - window)
+        fileobj.seek(start)
+        tail = fileobj.read(size - start)
+        lines = tail.split(b'\n')
+        # The first piece may be a partial line unless the window reaches the file start
+        offsets = []
+        position = start
+        for line in lines:
+            offsets.append(position)
+            position += len(line) + 1
+        first = 0 if start == 0 else 1
+        for i in range(len(lines) - 1, first - 1, -1):
+            text = lines[i].decode('utf-8', errors='ignore').lstrip('\ufeff')
+            if preprocessor.HEADER_PATTERN.match(text):
+                return offsets[i], lines[i]
+        if start == 0:
+            return 0, b''
+        window *= 4
+
+
+def _find_anchor(fileobj, anchor):
+    """Byte offset of the last line starting with ``anchor``, or -1 (searches from the end)."""
+    if not anchor:
+        return -1
+    needle = b'\n' + anchor
+    end = _size(fileobj)
+    while end > 0:
+        start = max(0, end - BLOCK_SIZE)
+        fileobj.seek(start)
+        # Overlap the next block so a needle straddling the boundary is found
+        block = fileobj.read(end - start + len(needle))
+        found = block.rfind(needle)
+        if found >= 0:
+            return start + found + 1
+        end = start
+    return -1
+
+
+def _same_message(stored, parsed):
+    same_date = stored['date'] == parsed['date'] or (pd.isna(stored['date']) and pd.isna(parsed['date']))
+    return same_date and str(stored['user']) == str(parsed['user']) and stored['message'] == parsed['message']
+
+
+def update(state, fileobj, key=None):
+    """Bring ``state`` up to date with a new export of the same chat.
+
+    Returns ``(new_state, mode)`` where mode is 'unchanged' when nothing was
+    added, 'append' when only the new messages were parsed, or 'full' when
+    the export did not extend the stored chat and was parsed from scratch
+    (through snapshot.load_or_parse when the export's content ``key`` is given).
+    """
+    size = _size(fileobj)
+    start = -1
+    if state.df.shape[0] and size >= state.prefix_len and _digest(fileobj, state.prefix_len) == state.prefix_digest:
+        start = state.prefix_len
+    elif state.df.shape[0]:
+        start = _find_anchor(fileobj, state.anchor)
+
+    if start >= 0:
+        fileobj.seek(start)
+        tail = fileobj.read().decode('utf-8')
+        delta = preprocessor.add_time_features(preprocessor.parse_chat(tail, state.dialect))
+        if len(delta) and _same_message(state.df.iloc[-1], delta.iloc[0]):
+            delta = delta.iloc[1:].reset_index(drop=True)
+            prefix_len, anchor = _last_header(fileobj)
+            if len(delta) == 0:
+                new_state = ChatState(state.df, state.index, state.dialect, prefix_len,
+                                      _digest(fileobj, prefix_len), anchor)
+                return new_state, 'unchanged'
+
+            df = preprocessor.concat_frames([state.df, delta])
+            index = helper.register_index(df, state.index.combine(helper.ChatIndex(delta)))
+            return ChatState(df, index, state.dialect, prefix_len, _digest(fileobj, prefix_len), anchor), 'append'
+
+    df = snapshot.load_or_parse(fileobj, key) if key is not None else None
+    return ChatState.from_file(fileobj, df), 'full'
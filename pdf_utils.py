@@ -1,20 +1,103 @@
 from fpdf import FPDF
 import os
 import base64
+import hashlib
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
-import matplotlib.pyplot as plt
-import seaborn as sns
+from functools import lru_cache
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import pandas as pd
 import numpy as np
 from io import BytesIO
-import tempfile
+import threading
+import zlib
+from PIL import Image
+import cache
+import pools
+import profiling
+
+LOGO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logo.png')
+
+# Parsed image streams shared by every report in this process, keyed by content hash
+_image_info = {}
+_image_info_lock = threading.Lock()
+
+
+def _predictor_rows(pixels):
+    """Prefix every pixel row with PNG filter type 0, as /Predictor 15 expects."""
+    rows = pixels.reshape(pixels.shape[0], -1)
+    return np.hstack([np.zeros((rows.shape[0], 1), dtype=np.uint8), rows]).tobytes()
+
+
+def _parse_image(data):
+    """Decode an in-memory image into fpdf's image info dict (8-bit RGB plus optional soft mask)."""
+    img = Image.open(BytesIO(data))
+    has_alpha = img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info
+    pixels = np.asarray(img.convert('RGBA' if has_alpha else 'RGB'))
+    height, width = pixels.shape[:2]
+    info = {
+        'w': width, 'h': height, 'cs': 'DeviceRGB', 'bpc': 8, 'f': 'FlateDecode',
+        'dp': f'/Predictor 15 /Colors 3 /BitsPerComponent 8 /Columns {width}',
+        'pal': '', 'trns': '',
+        'data': zlib.compress(_predictor_rows(pixels[..., :3]), 6),
+    }
+    # Opaque images (e.g. charts on a white background) need no soft mask
+    if has_alpha and (pixels[..., 3] != 255).any():
+        info['smask'] = zlib.compress(_predictor_rows(pixels[..., 3]), 6)
+    return info
+
+
+def image_info(data):
+    """Return (content key, parsed info) for PNG/JPEG bytes, parsing each distinct image once."""
+    key = hashlib.blake2b(data, digest_size=16).hexdigest()
+    with _image_info_lock:
+        info = _image_info.get(key)
+    if info is None:
+        info = _parse_image(data)
+        with _image_info_lock:
+            _image_info[key] = info
+    return key, info
+
+
+@lru_cache(maxsize=None)
+def _logo():
+    """(content key, parsed info) of the logo, read and hashed once per process; None without a logo."""
+    try:
+        with open(LOGO_PATH, 'rb') as f:
+            return image_info(f.read())
+    except OSError:
+        return None
+
 
 class PDF(FPDF):
+    def image_bytes(self, data, x=None, y=None, w=0, h=0, link=''):
+        """Place an image given as bytes; identical images are stored once per document."""
+        self.place_image(*image_info(data), x, y, w, h, link)
+
+    def place_image(self, key, info, x=None, y=None, w=0, h=0, link=''):
+        """Place an image already parsed by image_info()."""
+        name = 'mem:' + key
+        if name not in self.images:
+            # fpdf drops the stream data after writing, so each document gets its own copy
+            self.images[name] = dict(info, i=len(self.images) + 1)
+        self.image(name, x, y, w, h, link=link)
+
+    def write_to(self, stream, chunk_size=1 << 20):
+        """Write the finished document to a binary stream, encoding it chunk by chunk."""
+        if self.state < 3:
+            self.close()
+        for start in range(0, len(self.buffer), chunk_size):
+            stream.write(self.buffer[start:start + chunk_size].encode('latin-1'))
+        return stream
+
     def header(self):
         # Logo
         try:
-            self.image('logo.png', 10, 8, 25)
-        except:
+            logo = _logo()
+            if logo:
+                self.place_image(*logo, 10, 8, 25)
+        except Exception:
             # If logo fails to load, continue without it
             pass
         # Arial bold 15
@@ -34,129 +117,196 @@ class PDF(FPDF):
         # Page number
         self.cell(0, 10, f'Page {self.page_no()}/{{nb}}', 0, 0, 'C')
 
-def create_visualization_charts(df, selected_user, helper_module):
-    """Create visualization charts and return as image files"""
-    charts = {}
-    
+# Resolution and worker processes used to render report charts
+CHART_DPI = 150
+CHART_WORKERS = int(os.environ.get('ECHOMIND_CHART_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+
+def _new_chart(figsize):
+    """Create a standalone Agg figure (no pyplot global state, safe in worker processes)."""
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig, fig.add_subplot()
+
+
+def _chart_png(fig, dpi):
+    fig.tight_layout()
+    img_buffer = BytesIO()
+    fig.savefig(img_buffer, format='png', dpi=dpi, bbox_inches='tight')
+    return img_buffer.getvalue()
+
+
+def _render_monthly_timeline(timeline, dpi):
+    fig, ax = _new_chart((10, 6))
+    ax.plot(timeline['time'], timeline['message'], color='#4f46e5', linewidth=2)
+    ax.set_title('Monthly Message Activity', fontsize=14, fontweight='bold')
+    ax.set_xlabel('Month')
+    ax.set_ylabel('Number of Messages')
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.grid(True, alpha=0.3)
+    return _chart_png(fig, dpi)
+
+
+def _render_daily_timeline(daily_timeline, dpi):
+    fig, ax = _new_chart((10, 6))
+    ax.fill_between(daily_timeline['only_date'], daily_timeline['message'], color='#7c3aed', alpha=0.7)
+    ax.set_title('Daily Message Activity', fontsize=14, fontweight='bold')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Number of Messages')
+    ax.grid(True, alpha=0.3)
+    return _chart_png(fig, dpi)
+
+
+def _render_bar_counts(counts, dpi, title, xlabel, color, ylabel='Number of Messages'):
+    fig, ax = _new_chart((8, 6))
+    ax.bar([str(label) for label in counts.index], counts.values, color=color)
+    ax.set_title(title, fontsize=14, fontweight='bold')
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.tick_params(axis='x', labelrotation=90)
+    ax.grid(True, alpha=0.3)
+    return _chart_png(fig, dpi)
+
+
+def _render_weekly_activity(busy_day, dpi):
+    return _render_bar_counts(busy_day, dpi, 'Most Active Day of Week', 'Day of Week', '#4f46e5')
+
+
+def _render_monthly_activity(busy_month, dpi):
+    return _render_bar_counts(busy_month, dpi, 'Most Active Month', 'Month', '#7c3aed')
+
+
+def _render_common_words(most_common_df, dpi):
+    fig, ax = _new_chart((10, 8))
+    top_words = most_common_df.head(15)
+    y_pos = np.arange(len(top_words))
+    ax.barh(y_pos, top_words[1], color='#10b981')
+    ax.set_yticks(y_pos)
+    ax.set_yticklabels(top_words[0])
+    ax.set_xlabel('Frequency')
+    ax.set_title('Most Common Words', fontsize=14, fontweight='bold')
+    ax.invert_yaxis()
+    return _chart_png(fig, dpi)
+
+
+def _render_emoji_analysis(emoji_df, dpi):
+    fig, ax = _new_chart((8, 6))
+    top_emojis = emoji_df.head(10)
+    ax.bar(range(len(top_emojis)), top_emojis[1], color='#f59e0b')
+    ax.set_title('Top Emojis Used', fontsize=14, fontweight='bold')
+    ax.set_xlabel('Emoji')
+    ax.set_ylabel('Frequency')
+    ax.set_xticks(range(len(top_emojis)))
+    ax.set_xticklabels(top_emojis[0], fontsize=12)
+    return _chart_png(fig, dpi)
+
+
+def _render_conversation_starters(starters, dpi):
+    return _render_bar_counts(starters.head(15), dpi, 'Who Starts Conversations', 'User', '#0ea5e9',
+                              ylabel='Sessions Started')
+
+
+def _render_response_times(pairs, dpi):
+    fig, ax = _new_chart((10, 8))
+    top_pairs = pairs.head(15)
+    y_pos = np.arange(len(top_pairs))
+    ax.barh(y_pos, top_pairs['median_minutes'], color='#ec4899')
+    ax.set_yticks(y_pos)
+    ax.set_yticklabels([f'{user} -> {other}' for user, other in zip(top_pairs['user'], top_pairs['replied_to'])])
+    ax.set_xlabel('Median Reply Time (minutes)')
+    ax.set_title('Reply Times of the Most Frequent Pairs', fontsize=14, fontweight='bold')
+    ax.invert_yaxis()
+    return _chart_png(fig, dpi)
+
+
+# Report charts in page order: name -> (helper function, renderer)
+CHARTS = {
+    'monthly_timeline': ('monthly_timeline', _render_monthly_timeline),
+    'daily_timeline': ('daily_timeline', _render_daily_timeline),
+    'weekly_activity': ('week_activity_map', _render_weekly_activity),
+    'monthly_activity': ('month_activity_map', _render_monthly_activity),
+    'common_words': ('most_common_words', _render_common_words),
+    'emoji_analysis': ('emoji_helper', _render_emoji_analysis),
+    'conversation_starters': ('conversation_starters', _render_conversation_starters),
+    'response_times': ('response_times', _render_response_times),
+}
+
+
+@profiling.timed()
+def collect_chart_data(df, selected_user, helper_module):
+    """Compute the aggregate behind every report chart once, skipping empty ones."""
+    data = {}
+    for name, (helper_name, _) in CHARTS.items():
+        values = getattr(helper_module, helper_name)(selected_user, df)
+        if not values.empty:
+            data[name] = values
+    return data
+
+
+def _render_chart(args):
+    name, values, dpi = args
+    with profiling.stage(f'pdf_utils.render_chart.{name}') as span:
+        image = CHARTS[name][1](values, dpi)
+        span.add(nbytes=len(image))
+    return image
+
+
+def _chart_cache_key(name, values, dpi):
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(pd.util.hash_pandas_object(values, index=True).values.tobytes())
+    digest.update(repr([str(c) for c in getattr(values, 'columns', [])]).encode())
+    return ('chart', name, dpi, digest.hexdigest())
+
+
+@profiling.timed()
+def create_visualization_charts(df, selected_user, helper_module, workers=None, use_cache=True, dpi=CHART_DPI):
+    """Render the report charts and return them as PNG buffers keyed by chart name.
+
+    Aggregates are computed once in this process; figures are drawn with the
+    object-oriented Agg API, in parallel worker processes when ``workers`` > 1.
+    With ``use_cache`` rendered images are reused for identical data and settings.
+    """
+    if workers is None:
+        workers = CHART_WORKERS
+    data = collect_chart_data(df, selected_user, helper_module)
+
+    images = {}
+    pending = []
+    for name, values in data.items():
+        key = _chart_cache_key(name, values, dpi)
+        image = cache.results.get(key) if use_cache else None
+        if image is None:
+            pending.append((name, values, dpi, key))
+        else:
+            images[name] = image
+
     try:
-        # Set style for better looking charts
-        plt.style.use('default')
-        sns.set_palette("husl")
-        
-        # 1. Monthly Timeline
-        timeline = helper_module.monthly_timeline(selected_user, df)
-        if not timeline.empty:
-            fig, ax = plt.subplots(figsize=(10, 6))
-            timeline.plot(kind='line', ax=ax, color='#4f46e5', linewidth=2)
-            ax.set_title('Monthly Message Activity', fontsize=14, fontweight='bold')
-            ax.set_xlabel('Month')
-            ax.set_ylabel('Number of Messages')
-            ax.grid(True, alpha=0.3)
-            plt.tight_layout()
-            
-            # Save to bytes
-            img_buffer = BytesIO()
-            plt.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight')
-            img_buffer.seek(0)
-            charts['monthly_timeline'] = img_buffer
-            plt.close()
-        
-        # 2. Daily Activity
-        daily_timeline = helper_module.daily_timeline(selected_user, df)
-        if not daily_timeline.empty:
-            fig, ax = plt.subplots(figsize=(10, 6))
-            daily_timeline.plot(kind='area', ax=ax, color='#7c3aed', alpha=0.7)
-            ax.set_title('Daily Message Activity', fontsize=14, fontweight='bold')
-            ax.set_xlabel('Date')
-            ax.set_ylabel('Number of Messages')
-            ax.grid(True, alpha=0.3)
-            plt.tight_layout()
-            
-            img_buffer = BytesIO()
-            plt.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight')
-            img_buffer.seek(0)
-            charts['daily_timeline'] = img_buffer
-            plt.close()
-        
-        # 3. Weekly Activity
-        busy_day = helper_module.week_activity_map(selected_user, df)
-        if not busy_day.empty:
-            fig, ax = plt.subplots(figsize=(8, 6))
-            busy_day.plot(kind='bar', ax=ax, color='#4f46e5')
-            ax.set_title('Most Active Day of Week', fontsize=14, fontweight='bold')
-            ax.set_xlabel('Day of Week')
-            ax.set_ylabel('Number of Messages')
-            ax.grid(True, alpha=0.3)
-            plt.tight_layout()
-            
-            img_buffer = BytesIO()
-            plt.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight')
-            img_buffer.seek(0)
-            charts['weekly_activity'] = img_buffer
-            plt.close()
-        
-        # 4. Monthly Activity
-        busy_month = helper_module.month_activity_map(selected_user, df)
-        if not busy_month.empty:
-            fig, ax = plt.subplots(figsize=(8, 6))
-            busy_month.plot(kind='bar', ax=ax, color='#7c3aed')
-            ax.set_title('Most Active Month', fontsize=14, fontweight='bold')
-            ax.set_xlabel('Month')
-            ax.set_ylabel('Number of Messages')
-            ax.grid(True, alpha=0.3)
-            plt.tight_layout()
-            
-            img_buffer = BytesIO()
-            plt.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight')
-            img_buffer.seek(0)
-            charts['monthly_activity'] = img_buffer
-            plt.close()
-        
-        # 5. Most Common Words (if available)
-        most_common_df = helper_module.most_common_words(selected_user, df)
-        if not most_common_df.empty and len(most_common_df) > 0:
-            fig, ax = plt.subplots(figsize=(10, 8))
-            top_words = most_common_df.head(15)
-            y_pos = np.arange(len(top_words))
-            ax.barh(y_pos, top_words[1], color='#10b981')
-            ax.set_yticks(y_pos)
-            ax.set_yticklabels(top_words[0])
-            ax.set_xlabel('Frequency')
-            ax.set_title('Most Common Words', fontsize=14, fontweight='bold')
-            ax.invert_yaxis()
-            plt.tight_layout()
-            
-            img_buffer = BytesIO()
-            plt.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight')
-            img_buffer.seek(0)
-            charts['common_words'] = img_buffer
-            plt.close()
-        
-        # 6. Emoji Analysis (if available)
-        emoji_df = helper_module.emoji_helper(selected_user, df)
-        if not emoji_df.empty and len(emoji_df) > 0:
-            fig, ax = plt.subplots(figsize=(8, 6))
-            top_emojis = emoji_df.head(10)
-            ax.bar(range(len(top_emojis)), top_emojis[1], color='#f59e0b')
-            ax.set_title('Top Emojis Used', fontsize=14, fontweight='bold')
-            ax.set_xlabel('Emoji')
-            ax.set_ylabel('Frequency')
-            ax.set_xticks(range(len(top_emojis)))
-            ax.set_xticklabels(top_emojis[0], fontsize=12)
-            plt.tight_layout()
-            
-            img_buffer = BytesIO()
-            plt.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight')
-            img_buffer.seek(0)
-            charts['emoji_analysis'] = img_buffer
-            plt.close()
-            
+        jobs = [(name, values, dpi) for name, values, dpi, _ in pending]
+        if workers > 1 and len(jobs) > 1:
+            # Worker processes are shared with the rest of the app (see pools)
+            pool = pools.get_pool(workers)
+            try:
+                rendered = list(pool.map(_render_chart, jobs))
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for memory): start a fresh pool next
+                # time and render this report in-process
+                pools.reset_pool(pool)
+                rendered = [_render_chart(job) for job in jobs]
+        else:
+            rendered = [_render_chart(job) for job in jobs]
     except Exception as e:
         print(f"Error creating charts: {e}")
-    
-    return charts
+        rendered = []
+
+    for (name, _, _, key), image in zip(pending, rendered):
+        images[name] = image
+        if use_cache:
+            cache.results.put(key, image)
+
+    return {name: BytesIO(images[name]) for name in CHARTS if name in images}
 
-def create_pdf_report(df, selected_user, num_messages, words, num_media_messages, num_links):
+@profiling.timed()
+def create_pdf_report(df, selected_user, num_messages, words, num_media_messages, num_links, chart_workers=None):
     """
     Create a PDF report from the analysis data with visualizations
     
@@ -167,11 +317,11 @@ def create_pdf_report(df, selected_user, num_messages, words, num_media_messages
         words: Total number of words
         num_media_messages: Number of media messages
         num_links: Number of links shared
+        chart_workers: Processes used to render charts (defaults to CHART_WORKERS)
         
     Returns:
         BytesIO: PDF buffer
     """
-    from io import BytesIO
     import helper
 
     pdf = PDF()
@@ -220,8 +370,27 @@ def create_pdf_report(df, selected_user, num_messages, words, num_media_messages
         pdf.cell(col_width, row_height, str(row[1]), border=1)
         pdf.ln(row_height)
 
+    # Conversation sessions and reply times
+    sessions, session_minutes, session_messages, reply_minutes, started = helper.conversation_stats(selected_user, df)
+    pdf.ln(5)
+    pdf.set_font('Arial', 'B', 12)
+    pdf.cell(0, 10, 'Conversation Dynamics', 0, 1)
+    pdf.set_font('Arial', '', 10)
+
+    conversation = [
+        ['Conversation Sessions', f'{sessions:,}'],
+        ['Sessions Started', f'{started:,}'],
+        ['Median Session Length', f'{session_minutes:.0f} min, {session_messages:.0f} messages'],
+        ['Median Reply Time', f'{reply_minutes:.1f} min'],
+    ]
+
+    for row in conversation:
+        pdf.cell(col_width, row_height, str(row[0]), border=1)
+        pdf.cell(col_width, row_height, str(row[1]), border=1)
+        pdf.ln(row_height)
+
     # Create visualizations
-    charts = create_visualization_charts(df, selected_user, helper)
+    charts = create_visualization_charts(df, selected_user, helper, workers=chart_workers)
     
     # Add visualizations to PDF
     if charts:
@@ -233,11 +402,6 @@ def create_pdf_report(df, selected_user, num_messages, words, num_media_messages
         # Add charts
         for chart_name, chart_buffer in charts.items():
             try:
-                # Save chart to temporary file
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp_file:
-                    tmp_file.write(chart_buffer.getvalue())
-                    tmp_file_path = tmp_file.name
-                
                 # Add chart to PDF
                 pdf.set_font('Arial', 'B', 12)
                 chart_title = chart_name.replace('_', ' ').title()
@@ -245,12 +409,9 @@ def create_pdf_report(df, selected_user, num_messages, words, num_media_messages
                 pdf.ln(2)
                 
                 # Add image (centered, max width 180mm)
-                pdf.image(tmp_file_path, x=10, y=None, w=180)
+                pdf.image_bytes(chart_buffer.getvalue(), x=10, y=None, w=180)
                 pdf.ln(5)
-                
-                # Clean up temporary file
-                os.unlink(tmp_file_path)
-                
+
             except Exception as e:
                 print(f"Error adding chart {chart_name}: {e}")
                 continue
@@ -283,6 +444,8 @@ def create_pdf_report(df, selected_user, num_messages, words, num_media_messages
         insights.append("Detailed conversations with longer messages")
     if total_days > 30:
         insights.append("Long-term conversation analysis")
+    if sessions and reply_minutes <= 5:
+        insights.append("Quick back-and-forth replies (median under 5 minutes)")
 
     if insights:
         for insight in insights:
@@ -296,10 +459,10 @@ def create_pdf_report(df, selected_user, num_messages, words, num_media_messages
     pdf.cell(0, 10, 'Report generated by EchoMind - Advanced Conversation Analysis Platform', 0, 1, 'C')
     pdf.cell(0, 10, 'Made with love by Satyam Govind Yadav & Arunkumar Gupta', 0, 1, 'C')
 
-    # Return PDF as BytesIO buffer (ensure non-empty)
-    pdf_bytes = pdf.output(dest='S').encode('latin-1')
-    from io import BytesIO as _BytesIO
-    buffer = _BytesIO(pdf_bytes)
+    # Return PDF as BytesIO buffer
+    with profiling.stage('pdf_utils.write_pdf') as span:
+        buffer = pdf.write_to(BytesIO())
+        span.add(nbytes=buffer.tell())
     buffer.seek(0)
     return buffer
 
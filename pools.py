@@ -0,0 +1,42 @@
+"""The process pool shared by the app's CPU-heavy work (report charts, parsing several chats).
+
+Every caller uses the same workers, so the app keeps a single set of
+processes that import pandas and matplotlib once. Workers start from a
+clean server process instead of being forked from the multi-threaded app,
+where a lock held by another thread would stay held in the child.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+_pool = None
+_pool_workers = 0
+_lock = threading.Lock()
+
+
+def get_pool(workers):
+    """The shared pool, restarted with more processes when ``workers`` exceeds its size."""
+    global _pool, _pool_workers
+    with _lock:
+        if _pool is None or _pool_workers < workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers,
+                                        mp_context=multiprocessing.get_context(START_METHOD))
+            _pool_workers = workers
+        return _pool
+
+
+def reset_pool(broken=None):
+    """Drop the pool (after a worker died) so the next get_pool() starts a fresh one.
+
+    With ``broken``, the pool is only dropped if it is still that pool, so a
+    caller that saw an old pool break does not shut down its replacement.
+    """
+    global _pool
+    with _lock:
+        if _pool is not None and (broken is None or _pool is broken):
+            _pool.shutdown(wait=False)
+            _pool = None
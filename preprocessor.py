@@ -1,72 +1,386 @@
+import io
+import itertools
+import os
 import re
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
 
-def preprocess(data):
-    # Robust WhatsApp date pattern: matches e.g. 12/05/2023, 10:15 - or 5/12/23, 10:15 AM - or 12-05-2023, 10:15 pm -
-    pattern = r'((?:\d{1,2}[\/\-]){2}\d{2,4}),?\s\d{1,2}:\d{2}(?:\s?[APMapm]{2})?\s-\s'
-
-    messages = re.split(pattern, data)[1:]
-    # The split will alternate: [date, message, date, message, ...]
-    dates = messages[::2]
-    messages = messages[1::2]
-
-    df = pd.DataFrame({'user_message': messages, 'message_date': dates})
-    # convert message_date type
-    df['message_date'] = df['message_date'].astype(str).str.strip()
-    # Try multiple common WhatsApp date formats
-    def try_parse_date(s):
-        for fmt in [
-            '%d/%m/%Y, %H:%M', '%d/%m/%y, %H:%M', '%d-%m-%Y, %H:%M', '%d-%m-%y, %H:%M',
-            '%d/%m/%Y, %I:%M %p', '%d/%m/%y, %I:%M %p', '%d-%m-%Y, %I:%M %p', '%d-%m-%y, %I:%M %p',
-            '%m/%d/%Y, %H:%M', '%m/%d/%y, %H:%M', '%m-%d-%Y, %H:%M', '%m-%d-%y, %H:%M',
-            '%m/%d/%Y, %I:%M %p', '%m/%d/%y, %I:%M %p', '%m-%d-%Y, %I:%M %p', '%m-%d-%y, %I:%M %p',
-        ]:
-            try:
-                return pd.to_datetime(s, format=fmt)
-            except Exception:
-                continue
-        # Fallback to dateutil parser
+import profiling
+
+# One compiled pattern matches a whole message header in a single scan:
+# date parts, time, optional AM/PM marker and the optional "author: " prefix.
+# e.g. 12/05/2023, 10:15 - Alice: / 5/12/23, 10:15 AM - Bob: / 12-05-2023, 10:15 pm -
+HEADER_PATTERN = re.compile(
+    r'^(\d{1,2})[/\-](\d{1,2})[/\-](\d{2,4}),?\s(\d{1,2}):(\d{2})(?:\s?([APap])\.?[Mm]\.?)?\s-\s'
+    r'(?:([^\n]+?):\s)?',
+    re.MULTILINE,
+)
+HEADER_GROUPS = HEADER_PATTERN.groups
+
+# Headers inspected at a time when scanning raw text for the date dialect
+DIALECT_BATCH_SIZE = 5000
+
+# Lines buffered per chunk by the streaming reader
+CHUNK_LINES = 100000
+
+# Exports smaller than this are parsed serially even when workers are requested
+PARALLEL_MIN_CHARS = 1 << 22
+
+# Store message text as Arrow-backed strings (smaller and faster .str operations)
+ARROW_STRINGS = os.environ.get('ECHOMIND_ARROW_STRINGS', '0') == '1'
+
+ChatDialect = namedtuple('ChatDialect', ['day_first', 'twelve_hour'])
+
+MONTH_NAMES = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+               'August', 'September', 'October', 'November', 'December']
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+# Hour buckets of the activity heatmap: 00-1, 1-2, ..., 22-23, 23-00
+PERIOD_LABELS = ['00-1'] + [f'{hour}-{hour + 1}' for hour in range(1, 23)] + ['23-00']
+
+MONTH_DTYPE = pd.CategoricalDtype(MONTH_NAMES, ordered=True)
+DAY_DTYPE = pd.CategoricalDtype(DAY_NAMES, ordered=True)
+PERIOD_DTYPE = pd.CategoricalDtype(PERIOD_LABELS, ordered=True)
+
+# Smallest integer type for each calendar column (nullable variants are used when dates are missing)
+INT_COLUMNS = {'year': 'int16', 'month_num': 'int8', 'day': 'int8', 'hour': 'int8', 'minute': 'int8'}
+
+
+def _day_first(first, second):
+    """True or False when the date components settle the day/month order, None when none is above 12."""
+    first = np.asarray(first, dtype=np.int64)
+    second = np.asarray(second, dtype=np.int64)
+    if (first > 12).any():
+        return True
+    if (second > 12).any():
+        return False
+    return None
+
+
+def detect_dialect(first, second, meridiem):
+    """Guess whether an export writes dates day-first and uses a 12h clock.
+
+    ``first`` and ``second`` are the two leading date components of the
+    headers and ``meridiem`` the captured AM/PM markers (None when absent).
+    A component above 12 can only be a day; when every header is ambiguous
+    the export is treated as day-first, which is WhatsApp's default outside the US.
+    """
+    day_first = _day_first(first, second)
+    twelve_hour = any(m is not None for m in meridiem)
+    return ChatDialect(day_first is not False, twelve_hour)
+
+
+def _split_headers(data):
+    """Split raw export text into the per-group columns of HEADER_PATTERN.
+
+    Returns a list of HEADER_GROUPS + 1 lists (the header groups followed by
+    the message bodies); text before the first header is dropped. Line
+    endings are normalized as iter_lines' universal newlines do, so every
+    entry point yields the same message text.
+    """
+    if data.startswith('\ufeff'):
+        data = data[1:]
+    if '\r' in data:
+        data = data.replace('\r\n', '\n').replace('\r', '\n')
+    parts = HEADER_PATTERN.split(data)[1:]
+    stride = HEADER_GROUPS + 1
+    return [parts[i::stride] for i in range(stride)]
+
+
+def _build_frame(columns, dialect=None):
+    """Turn split header columns into the base date/user/message frame."""
+    first, second, year, hour, minute, meridiem, users, messages = columns
+
+    first = np.array(first, dtype=np.int64)
+    second = np.array(second, dtype=np.int64)
+    if dialect is None:
+        # Every header counts: a US chat may only reach day 13 long after its first messages
+        dialect = detect_dialect(first, second, meridiem)
+    year = np.array(year, dtype=np.int64)
+    hour = np.array(hour, dtype=np.int64)
+    minute = np.array(minute, dtype=np.int64)
+
+    year = np.where(year < 100, year + 2000, year)
+    if dialect.twelve_hour:
+        pm = np.array([m is not None and m in 'Pp' for m in meridiem], dtype=bool)
+        has_marker = np.array([m is not None for m in meridiem], dtype=bool)
+        hour = np.where(has_marker, hour % 12 + np.where(pm, 12, 0), hour)
+
+    day, month = (first, second) if dialect.day_first else (second, first)
+    dates = pd.to_datetime(
+        pd.DataFrame({'year': year, 'month': month, 'day': day, 'hour': hour, 'minute': minute}),
+        errors='coerce',
+    )
+
+    # Explicit dtypes keep a chat without any header (e.g. not an export) a valid, empty frame
+    return pd.DataFrame({
+        'date': pd.Series(dates, dtype='datetime64[ns]'),
+        'user': pd.Series([u if u is not None else 'group_notification' for u in users], dtype='str'),
+        'message': pd.Series(messages, dtype='str'),
+    })
+
+
+@profiling.timed()
+def parse_chat(data, dialect=None):
+    """Parse raw export text into a date/user/message DataFrame in one scan.
+
+    The date dialect is detected once from all headers unless an
+    explicit ChatDialect is given, and all timestamps are then converted in a
+    single vectorized step.
+    """
+    return _build_frame(_split_headers(data), dialect)
+
+
+def compact_dtypes(df, arrow_strings=None):
+    """Shrink the text columns of a parsed frame: user as a categorical and,
+    optionally, message text as Arrow-backed strings.
+
+    The calendar columns are already produced compact by add_time_features.
+    """
+    if arrow_strings is None:
+        arrow_strings = ARROW_STRINGS
+    df['user'] = df['user'].astype('category')
+    if arrow_strings:
+        df['message'] = df['message'].astype('string[pyarrow]')
+    return df
+
+
+@profiling.timed()
+def concat_frames(frames):
+    """Concatenate preprocessed chunks in order, keeping the compact dtypes."""
+    if len(frames) == 1:
+        return frames[0]
+    df = pd.concat(frames, ignore_index=True)
+    # User categories differ per chunk and come back as plain strings
+    df['user'] = df['user'].astype('category')
+    nullable = df['date'].isna().any()
+    for column, dtype in INT_COLUMNS.items():
+        if column in df:
+            df[column] = df[column].astype(dtype.capitalize() if nullable else dtype)
+    return df
+
+
+TIME_FEATURES = ['only_date', 'year', 'month_num', 'month', 'day', 'day_name', 'hour', 'minute', 'period']
+
+
+def _time_features(dates, columns):
+    """Derive the requested calendar columns from a datetime Series in one vectorized pass.
+
+    Works on integer minute/day offsets from the epoch; the month, day and
+    period names are category codes into the fixed lookup tables above.
+    """
+    stamps = dates.to_numpy(dtype='datetime64[ns]').astype('datetime64[m]')
+    missing = np.isnat(stamps)
+    nullable = missing.any()
+    minutes = np.where(missing, 0, stamps.view('int64'))
+    days = minutes // 1440
+    months = stamps.astype('datetime64[M]').view('int64')
+
+    def integers(values, dtype):
+        values = values.astype(dtype)
+        if nullable:
+            return pd.arrays.IntegerArray(values, missing)
+        return values
+
+    def names(codes, dtype):
+        return pd.Categorical.from_codes(np.where(missing, -1, codes), dtype=dtype)
+
+    builders = {
+        'only_date': lambda: pd.Series(stamps.astype('datetime64[D]'), index=dates.index).astype(dates.dtype),
+        'year': lambda: integers(np.where(missing, 0, months // 12 + 1970), INT_COLUMNS['year']),
+        'month_num': lambda: integers(np.where(missing, 0, months % 12 + 1), INT_COLUMNS['month_num']),
+        'month': lambda: names(months % 12, MONTH_DTYPE),
+        'day': lambda: integers(days - np.where(missing, 0, stamps.astype('datetime64[M]').astype('datetime64[D]').view('int64')) + 1,
+                                INT_COLUMNS['day']),
+        # 1970-01-01 was a Thursday
+        'day_name': lambda: names((days + 3) % 7, DAY_DTYPE),
+        'hour': lambda: integers(minutes // 60 % 24, INT_COLUMNS['hour']),
+        'minute': lambda: integers(minutes % 60, INT_COLUMNS['minute']),
+        'period': lambda: names(minutes // 60 % 24, PERIOD_DTYPE),
+    }
+    return {column: builders[column]() for column in columns}
+
+
+@profiling.timed()
+def add_time_features(df, columns=None):
+    """Add the calendar columns the helper functions group by.
+
+    ``columns`` limits the work to a subset of TIME_FEATURES.
+    """
+    if columns is None:
+        columns = TIME_FEATURES
+    for column, values in _time_features(df['date'], columns).items():
+        df[column] = values
+    return compact_dtypes(df)
+
+
+def ensure_time_features(df, columns=TIME_FEATURES):
+    """Compute, in place, only the calendar columns ``df`` does not have yet."""
+    missing = [column for column in TIME_FEATURES if column in columns and column not in df]
+    if missing:
+        for column, values in _time_features(df['date'], missing).items():
+            df[column] = values
+    return df
+
+
+@profiling.timed()
+def preprocess(data, workers=1, lazy=False):
+    """Parse raw export text into the analysis DataFrame.
+
+    With ``lazy=True`` only date/user/message are built; the calendar columns
+    are added by ensure_time_features when an analysis first needs them.
+    """
+    if workers > 1:
+        return preprocess_parallel(data, workers)
+    df = parse_chat(data)
+    if lazy:
+        return compact_dtypes(df)
+    return add_time_features(df)
+
+
+def scan_dialect(texts):
+    """Detect the dialect of raw export text given as one or more pieces (e.g. lines).
+
+    Headers are read DIALECT_BATCH_SIZE at a time until one settles the
+    day/month order, so only a chat that never does is read to the end.
+    """
+    matches = (match for text in texts for match in HEADER_PATTERN.finditer(text))
+    twelve_hour = False
+    while True:
+        batch = [m.groups() for m in itertools.islice(matches, DIALECT_BATCH_SIZE)]
+        if not batch:
+            return ChatDialect(True, twelve_hour)
+        twelve_hour = twelve_hour or any(g[5] is not None for g in batch)
+        day_first = _day_first([g[0] for g in batch], [g[1] for g in batch])
+        if day_first is not None:
+            return ChatDialect(day_first, twelve_hour)
+
+
+def detect_chat_dialect(data):
+    """Detect the dialect of raw export text."""
+    return scan_dialect([data])
+
+
+def split_at_messages(data, parts):
+    """Cut raw export text into about ``parts`` pieces, each starting at a message header."""
+    bounds = [0]
+    for k in range(1, parts):
+        match = HEADER_PATTERN.search(data, max(bounds[-1] + 1, len(data) * k // parts))
+        if match is None:
+            break
+        bounds.append(match.start())
+    bounds.append(len(data))
+    return [data[start:end] for start, end in zip(bounds, bounds[1:])]
+
+
+def _preprocess_piece(args):
+    piece, dialect = args
+    return add_time_features(parse_chat(piece, dialect))
+
+
+@profiling.timed()
+def preprocess_parallel(data, workers=None):
+    """Parse raw export text on a process pool.
+
+    The text is split at message headers so no message is cut, the dialect
+    is detected once on the whole export, and the parsed pieces are
+    concatenated in order, giving the same frame as the serial path.
+    """
+    if data.startswith('\ufeff'):
+        data = data[1:]
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(data) < PARALLEL_MIN_CHARS:
+        return add_time_features(parse_chat(data))
+
+    dialect = detect_chat_dialect(data)
+    pieces = split_at_messages(data, workers * 4)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        frames = list(pool.map(_preprocess_piece, [(piece, dialect) for piece in pieces]))
+    return concat_frames(frames)
+
+
+def iter_lines(source):
+    """Yield text lines from a path, a binary/text file object or an iterable of lines."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'r', encoding='utf-8-sig') as f:
+            yield from f
+    elif isinstance(source, (io.RawIOBase, io.BufferedIOBase)):
+        if source.seekable():
+            source.seek(0)
+        text = io.TextIOWrapper(source, encoding='utf-8-sig')
         try:
-            return pd.to_datetime(s, errors='coerce')
-        except Exception:
-            return pd.NaT
-    df['message_date'] = df['message_date'].apply(try_parse_date)
-
-    df.rename(columns={'message_date': 'date'}, inplace=True)
-
-    users = []
-    messages = []
-    for message in df['user_message']:
-        entry = re.split(r'([\w\W]+?):\s', message)
-        if entry[1:]:  # user name
-            users.append(entry[1])
-            messages.append(" ".join(entry[2:]))
-        else:
-            users.append('group_notification')
-            messages.append(entry[0])
-
-    df['user'] = users
-    df['message'] = messages
-    df.drop(columns=['user_message'], inplace=True)
-
-    df['only_date'] = df['date'].dt.date
-    df['year'] = df['date'].dt.year
-    df['month_num'] = df['date'].dt.month
-    df['month'] = df['date'].dt.month_name()
-    df['day'] = df['date'].dt.day
-    df['day_name'] = df['date'].dt.day_name()
-    df['hour'] = df['date'].dt.hour
-    df['minute'] = df['date'].dt.minute
-
-    period = []
-    for hour in df[['day_name', 'hour']]['hour']:
-        if hour == 23:
-            period.append(str(hour) + "-" + str('00'))
-        elif hour == 0:
-            period.append(str('00') + "-" + str(hour + 1))
-        else:
-            period.append(str(hour) + "-" + str(hour + 1))
-
-    df['period'] = period
-
-    return df
\ No newline at end of file
+            # Not ``yield from``: closing this generator early would close the wrapper, and the buffer with it
+            for line in text:
+                yield line
+        finally:
+            # Leave the caller's buffer open (e.g. Streamlit's UploadedFile)
+            text.detach()
+    else:
+        yield from source
+
+
+def iter_chunks(source, chunk_size=CHUNK_LINES, dialect=None):
+    """Parse an export incrementally, yielding preprocessed DataFrame chunks.
+
+    ``source`` is a file path, a binary or text file object, or any iterable
+    of lines (with their line endings). Lines are buffered until roughly
+    ``chunk_size`` have been read and the buffer is only cut where a new
+    message header starts, so multi-line messages never straddle chunks. The
+    date dialect is detected from all headers of the first chunk that settles
+    the day/month order and reused for the rest; chunks before it (where no
+    date component exceeds 12) are held back until then. Otherwise only one
+    chunk of raw text is held in memory at a time.
+    """
+    pending = []
+
+    def parse(columns, dialect):
+        with profiling.stage('preprocessor.parse_chunk', rows=len(columns[0])):
+            return add_time_features(_build_frame(columns, dialect))
+
+    def split(text):
+        nonlocal dialect
+        with profiling.stage('preprocessor.split_chunk', nbytes=len(text)):
+            columns = _split_headers(text)
+        if not columns[0]:
+            return
+        if dialect is None:
+            day_first = _day_first(columns[0], columns[1])
+            if day_first is None:
+                pending.append(columns)
+                return
+            dialect = ChatDialect(day_first, any(m is not None for m in columns[5]))
+        while pending:
+            yield parse(pending.pop(0), dialect)
+        yield parse(columns, dialect)
+
+    buffer = []
+    for line in iter_lines(source):
+        if len(buffer) >= chunk_size and HEADER_PATTERN.match(line):
+            text = ''.join(buffer)
+            buffer = []
+            yield from split(text)
+        buffer.append(line)
+
+    text = ''.join(buffer)
+    if dialect is None and not pending and not HEADER_PATTERN.search(text):
+        # No message at all: still one (empty) chunk, so callers get a frame
+        yield parse(_split_headers(text), None)
+        return
+    yield from split(text)
+    # Ambiguous to the end: every held chunk is day-first, as detect_dialect decides
+    while pending:
+        columns = pending.pop(0)
+        yield parse(columns, detect_dialect(columns[0], columns[1], columns[5]))
+
+
+@profiling.timed()
+def preprocess_stream(source, chunk_size=CHUNK_LINES):
+    """Streaming counterpart of preprocess() for file objects and line iterables."""
+    return concat_frames(list(iter_chunks(source, chunk_size)))
+
+
+def preprocess_file(path, chunk_size=CHUNK_LINES):
+    """Parse the export stored at ``path`` without loading it into one string."""
+    return preprocess_stream(path, chunk_size)
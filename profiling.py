@@ -0,0 +1,229 @@
+"""Lightweight per-stage timing and counters for the analysis pipeline.
+
+Pipeline functions are wrapped with ``@timed('stage.name')`` or run inside
+``with stage('stage.name') as span: span.add(rows=..., nbytes=...)``. Each
+stage accumulates call and error counts, total/max/last wall time, rows and
+bytes processed (characters for decoded text), and the highest resident
+memory seen when it finished.
+
+Recording costs a few microseconds per call, so it stays on by default; set
+ECHOMIND_PROFILING=0 to turn it off. Figures are per process: stages run in
+worker pools are recorded in those workers.
+"""
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ENABLED = os.environ.get('ECHOMIND_PROFILING', '1') != '0'
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+# ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+_MAXRSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+# Resident memory is only sampled after stages at least this long (reading it costs ~10us)
+RSS_SAMPLE_MIN_SECONDS = 0.001
+
+_started = time.time()
+_lock = threading.Lock()
+_stages = {}
+
+
+def rss_bytes():
+    """Current resident set size (peak RSS where /proc is not available)."""
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes():
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_UNIT
+
+
+class StageStats:
+    __slots__ = ('calls', 'errors', 'total', 'max', 'last', 'rows', 'nbytes', 'rss_peak')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+        self.rows = 0
+        self.nbytes = 0
+        self.rss_peak = 0
+
+    def as_dict(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'total_seconds': round(self.total, 6),
+            'mean_seconds': round(self.total / self.calls, 6) if self.calls else 0.0,
+            'max_seconds': round(self.max, 6),
+            'last_seconds': round(self.last, 6),
+            'rows': self.rows,
+            'bytes': self.nbytes,
+            'rss_peak_bytes': self.rss_peak,
+        }
+
+
+def record(name, seconds, rows=0, nbytes=0, error=False):
+    """Add one finished call of stage ``name``."""
+    rss = rss_bytes() if seconds >= RSS_SAMPLE_MIN_SECONDS else 0
+    with _lock:
+        stats = _stages.get(name)
+        if stats is None:
+            stats = _stages[name] = StageStats()
+        stats.calls += 1
+        stats.errors += bool(error)
+        stats.total += seconds
+        stats.last = seconds
+        if seconds > stats.max:
+            stats.max = seconds
+        stats.rows += rows
+        stats.nbytes += nbytes
+        if rss > stats.rss_peak:
+            stats.rss_peak = rss
+
+
+def _rows(result):
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return len(result)
+    return 0
+
+
+class Span:
+    """Counters of one running stage; see stage()."""
+    __slots__ = ('rows', 'nbytes')
+
+    def __init__(self):
+        self.rows = 0
+        self.nbytes = 0
+
+    def add(self, rows=0, nbytes=0):
+        self.rows += rows
+        self.nbytes += nbytes
+
+
+@contextmanager
+def stage(name, rows=0, nbytes=0):
+    """Time the enclosed block as stage ``name``; the yielded span takes extra counts."""
+    span = Span()
+    span.add(rows, nbytes)
+    if not ENABLED:
+        yield span
+        return
+    start = time.perf_counter()
+    error = True
+    try:
+        yield span
+        error = False
+    finally:
+        record(name, time.perf_counter() - start, span.rows, span.nbytes, error)
+
+
+def timed(name=None):
+    """Decorator recording every call of the function as a stage.
+
+    Rows are counted automatically when the function returns a DataFrame or Series.
+    """
+    def decorate(func):
+        label = name or f'{func.__module__}.{func.__qualname__}'
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            result = None
+            error = True
+            try:
+                result = func(*args, **kwargs)
+                error = False
+                return result
+            finally:
+                record(label, time.perf_counter() - start, _rows(result), 0, error)
+
+        return wrapper
+    return decorate
+
+
+def reset():
+    with _lock:
+        _stages.clear()
+
+
+def snapshot():
+    """All stage figures plus process memory as a JSON-serializable dict."""
+    with _lock:
+        stages = {name: stats.as_dict() for name, stats in _stages.items()}
+    return {
+        'enabled': ENABLED,
+        'pid': os.getpid(),
+        'uptime_seconds': round(time.time() - _started, 3),
+        'rss_bytes': rss_bytes(),
+        'peak_rss_bytes': peak_rss_bytes(),
+        'stages': stages,
+    }
+
+
+def stage_table():
+    """Stage figures as a DataFrame, slowest total first."""
+    stages = snapshot()['stages']
+    table = pd.DataFrame.from_dict(stages, orient='index')
+    if table.empty:
+        return table
+    return table.rename_axis('stage').sort_values('total_seconds', ascending=False)
+
+
+def to_json(indent=2):
+    return json.dumps(snapshot(), indent=indent)
+
+
+# Prometheus metric name, type, help text and the stage field it reports
+_METRICS = [
+    ('echomind_stage_calls_total', 'counter', 'Calls of the pipeline stage', 'calls'),
+    ('echomind_stage_errors_total', 'counter', 'Calls of the pipeline stage that raised', 'errors'),
+    ('echomind_stage_seconds_total', 'counter', 'Wall time spent in the pipeline stage', 'total_seconds'),
+    ('echomind_stage_max_seconds', 'gauge', 'Slowest call of the pipeline stage', 'max_seconds'),
+    ('echomind_stage_rows_total', 'counter', 'Rows processed by the pipeline stage', 'rows'),
+    ('echomind_stage_bytes_total', 'counter', 'Bytes processed by the pipeline stage', 'bytes'),
+    ('echomind_stage_rss_peak_bytes', 'gauge', 'Highest resident memory seen after the stage', 'rss_peak_bytes'),
+]
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def to_prometheus():
+    """Render the snapshot in the Prometheus text exposition format."""
+    data = snapshot()
+    lines = []
+    for metric, kind, description, field in _METRICS:
+        lines.append(f'# HELP {metric} {description}')
+        lines.append(f'# TYPE {metric} {kind}')
+        for name, stats in sorted(data['stages'].items()):
+            lines.append(f'{metric}{{stage="{_label(name)}"}} {stats[field]}')
+    for metric, description, field in [
+        ('echomind_process_rss_bytes', 'Resident memory of the process', 'rss_bytes'),
+        ('echomind_process_peak_rss_bytes', 'Peak resident memory of the process', 'peak_rss_bytes'),
+    ]:
+        lines.append(f'# HELP {metric} {description}')
+        lines.append(f'# TYPE {metric} gauge')
+        lines.append(f'{metric} {data[field]}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,269 @@
+"""Offline lexicon-based sentiment scoring for English and Hinglish chats.
+
+Every message gets a compound score in [-1, 1]: the valences of its words
+and emoji (from sentiment_lexicon.txt) are summed, with negations ("not
+good", "acha nahi") flipping and intensifiers ("very", "bahut") boosting the
+word they qualify, and the sum is squashed the way VADER does. Scoring is
+vectorized over the whole message column, and scores are cached by message
+hash, so repeated messages and re-analyzed chats are only scored once.
+"""
+import os
+import re
+import threading
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+import profiling
+
+LEXICON_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sentiment_lexicon.txt')
+
+# Words that flip the valence of the next two words; Hinglish negations also follow the word
+NEGATIONS = frozenset([
+    'not', 'no', 'never', 'neither', 'nor', 'without', 'cannot', "can't", 'cant', "don't", 'dont',
+    "doesn't", 'doesnt', "didn't", 'didnt', "isn't", 'isnt', "wasn't", 'wasnt', "aren't", 'arent',
+    "won't", 'wont', "wouldn't", 'wouldnt', "shouldn't", "couldn't", 'nothing', 'nahi', 'nahin', 'nhi', 'mat',
+])
+POST_NEGATIONS = frozenset(['nahi', 'nahin', 'nhi', 'na'])
+INTENSIFIERS = frozenset([
+    'very', 'really', 'so', 'too', 'extremely', 'super', 'totally', 'absolutely', 'most', 'much',
+    'bahut', 'bohot', 'bohut', 'bht', 'bhot', 'zyada', 'jyada', 'ekdum', 'bilkul', 'kaafi', 'kafi',
+])
+NEGATION_SCALE = -0.74
+INTENSIFIER_SCALE = 1.3
+# Normalization constant of the compound score (as in VADER)
+ALPHA = 15.0
+# Compound scores beyond +/- this are positive / negative, the rest neutral
+NEUTRAL_BAND = 0.05
+
+# Characters that separate words (emoji are scored separately)
+WORD_SEPARATORS = r"[^\w']"
+# Skin tone modifiers and variation selectors are ignored when looking emoji up
+EMOJI_MODIFIERS = '[\U0001F3FB-\U0001F3FF\ufe0e\ufe0f]'
+
+# Messages are scored CHUNK_SIZE at a time, joined by SEPARATOR (never part of a message)
+CHUNK_SIZE = 100_000
+SEPARATOR = '\0'
+# Odd multiplier of the rolling word hash and its inverse modulo 2**64
+HASH_BASE = 1_000_003
+HASH_BASE_INVERSE = pow(HASH_BASE, -1, 2 ** 64)
+
+# Scores cached per message hash, dropped wholesale when it grows past this many entries
+CACHE_SIZE = 2_000_000
+
+_cache = pd.Series(dtype='float32', index=pd.Index([], dtype='uint64'))
+_cache_lock = threading.Lock()
+_power_tables = (np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.uint64))
+
+
+@lru_cache(maxsize=None)
+def load_lexicon(path=LEXICON_PATH):
+    """Read the lexicon once into a token -> valence Series."""
+    words, scores = [], []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            word, score = line.rsplit('\t', 1)
+            words.append(re.sub(EMOJI_MODIFIERS, '', word.lower()))
+            scores.append(float(score))
+    return pd.Series(scores, index=words, dtype='float64')
+
+
+def _codepoints(text):
+    return np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+
+
+@lru_cache(maxsize=None)
+def _word_chars():
+    """Lookup table over all code points: True for characters that are part of a word."""
+    table = np.zeros(0x110000, dtype=bool)
+    # Astral-plane characters (emoji mostly) never belong to a word
+    chars = ''.join(map(chr, range(0x10000)))
+    table[:0x10000] = _codepoints(re.sub(WORD_SEPARATORS, '\0', chars)) != 0
+    return table
+
+
+def _powers(n):
+    """HASH_BASE**(i+1) and its inverse for i < n, extended on demand and shared between calls."""
+    global _power_tables
+    powers, inverses = _power_tables
+    if len(powers) < n:
+        n = max(n, 2 * len(powers))
+        powers = np.cumprod(np.full(n, HASH_BASE, dtype=np.uint64))
+        inverses = np.cumprod(np.full(n, HASH_BASE_INVERSE, dtype=np.uint64))
+        _power_tables = (powers, inverses)
+    return powers, inverses
+
+
+def _tokenize(codepoints):
+    """Start offsets and hashes of the words in a code point array.
+
+    Each word's hash is a polynomial over its code points computed from
+    prefix sums (wrapping uint64 arithmetic), so words are identified without
+    materializing them as Python strings.
+    """
+    in_word = np.zeros(len(codepoints) + 2, dtype=np.int8)
+    in_word[1:-1] = _word_chars()[codepoints]
+    edges = np.diff(in_word)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    powers, inverses = _powers(len(codepoints))
+    # Terms of non-word characters never fall inside a word's [start, end) range
+    prefix = np.zeros(len(codepoints) + 1, dtype=np.uint64)
+    np.cumsum(codepoints * powers[:len(codepoints)], out=prefix[1:])
+    return starts, (prefix[ends] - prefix[starts]) * inverses[starts]
+
+
+@lru_cache(maxsize=None)
+def _lexicon_tables():
+    """Hash index of every word the scorer knows, with its valence and role, and the emoji valences."""
+    lexicon = load_lexicon()
+    is_word = lexicon.index.str.fullmatch(r"[\w']+")
+    vocabulary = sorted(set(lexicon.index[is_word]) | NEGATIONS | POST_NEGATIONS | INTENSIFIERS)
+    hashes = pd.Index(_tokenize(_codepoints(SEPARATOR.join(vocabulary)))[1])
+    if not hashes.is_unique:
+        raise ValueError('word hash collision in the sentiment vocabulary')
+    words = pd.Index(vocabulary)
+    emojis = lexicon[~is_word]
+    return {
+        'hashes': hashes,
+        'valence': lexicon.reindex(words).to_numpy(),
+        'negation': words.isin(NEGATIONS),
+        'post_negation': words.isin(POST_NEGATIONS),
+        'intensifier': words.isin(INTENSIFIERS),
+        'emojis': pd.Index([ord(e) for e in emojis.index]),
+        'emoji_valence': emojis.to_numpy(),
+    }
+
+
+def _shifted(mask, offset):
+    """``mask`` moved ``offset`` positions later (earlier when negative), padded with False."""
+    out = np.zeros_like(mask)
+    if offset > 0:
+        out[offset:] = mask[:-offset]
+    elif offset < 0:
+        out[:offset] = mask[-offset:]
+    else:
+        out[:] = mask
+    return out
+
+
+def _near(mask, offset, reach, ordinals, owners):
+    """True where the kept word ``offset`` places away is flagged in ``mask``,
+    belongs to the same message and is at most ``reach`` words away."""
+    distance = np.abs(ordinals - _shifted(ordinals, offset))
+    return _shifted(mask, offset) & (_shifted(owners, offset) == owners) & (distance <= reach)
+
+
+def _valence(texts, tables):
+    """Summed, negation- and intensity-adjusted valence of each text in ``texts``."""
+    codepoints = _codepoints(SEPARATOR.join(texts).lower())
+    boundaries = np.flatnonzero(codepoints == ord(SEPARATOR))
+    totals = np.zeros(len(texts))
+
+    starts, hashes = _tokenize(codepoints)
+    # Only words in the vocabulary are kept, with their ordinal so that
+    # "within two words" still counts the words in between
+    codes = tables['hashes'].get_indexer(hashes)
+    ordinals = np.flatnonzero(codes >= 0)
+    codes = codes[ordinals]
+    valence = tables['valence'][codes]
+    scored = ~np.isnan(valence)
+    if scored.any():
+        owners = np.searchsorted(boundaries, starts[ordinals])
+        is_negation = tables['negation'][codes]
+        # Negations flip the next two words (or, in Hinglish, the word before);
+        # intensifiers boost the next word
+        negated = (_near(is_negation, 1, 2, ordinals, owners) ^ _near(is_negation, 2, 2, ordinals, owners)
+                   ^ _near(tables['post_negation'][codes], -1, 1, ordinals, owners))
+        boosted = _near(tables['intensifier'][codes], 1, 1, ordinals, owners)
+
+        adjusted = valence * np.where(negated, NEGATION_SCALE, 1.0) * np.where(boosted, INTENSIFIER_SCALE, 1.0)
+        totals += np.bincount(owners[scored], weights=adjusted[scored], minlength=len(texts))
+
+    # Emoji are looked up per code point: skin tones and variation selectors
+    # are not in the lexicon, and a ZWJ sequence scores as the sum of its parts
+    symbols = np.flatnonzero(codepoints >= 0x2000)
+    codes = tables['emojis'].get_indexer(codepoints[symbols])
+    found = codes >= 0
+    if found.any():
+        owners = np.searchsorted(boundaries, symbols[found])
+        totals += np.bincount(owners, weights=tables['emoji_valence'][codes[found]], minlength=len(texts))
+    return totals
+
+
+def _compute_scores(messages):
+    """Compound score of each message in a list of distinct texts."""
+    tables = _lexicon_tables()
+    total = np.concatenate([_valence(messages[i:i + CHUNK_SIZE], tables) for i in range(0, len(messages), CHUNK_SIZE)]
+                           or [np.zeros(0)])
+    return (total / np.sqrt(total * total + ALPHA)).astype('float32')
+
+
+@profiling.timed()
+def score_messages(messages):
+    """Score a message column; returns float32 scores aligned with ``messages``.
+
+    Only messages whose hash is not cached yet are scored, each distinct text once.
+    """
+    if len(messages) == 0:
+        return pd.Series([], index=messages.index, dtype='float32')
+    hashes = pd.util.hash_pandas_object(messages, index=False).to_numpy()
+    with _cache_lock:
+        cache = _cache
+    scores = cache.reindex(hashes).to_numpy(dtype='float32', copy=True)
+
+    missing = np.isnan(scores)
+    if missing.any():
+        new_hashes, first = np.unique(hashes[missing], return_index=True)
+        texts = messages.iloc[np.flatnonzero(missing)[first]].tolist()
+        new_scores = _compute_scores(texts)
+        _remember(new_hashes, new_scores)
+        lookup = pd.Series(new_scores, index=pd.Index(new_hashes, dtype='uint64'))
+        scores[missing] = lookup.reindex(hashes[missing]).to_numpy()
+
+    return pd.Series(scores, index=messages.index)
+
+
+def _remember(hashes, scores):
+    global _cache
+    with _cache_lock:
+        fresh = pd.Series(scores, index=pd.Index(hashes, dtype='uint64'), dtype='float32')
+        if len(_cache) + len(fresh) > CACHE_SIZE:
+            _cache = fresh
+        else:
+            fresh = fresh[~fresh.index.isin(_cache.index)]
+            _cache = pd.concat([_cache, fresh])
+
+
+def clear_cache():
+    global _cache
+    with _cache_lock:
+        _cache = _cache.iloc[:0]
+
+
+def ensure_sentiment(df, messages):
+    """Add, in place, the 'sentiment' column of ``df`` with scores for ``messages``.
+
+    ``messages`` is the part of the message column to score, usually
+    helper.content_messages(df); other rows (media, notifications) stay NaN.
+    Only messages without a score yet are scored, so a frame extended with new
+    messages (see incremental.update) keeps the scores it already has.
+    """
+    if 'sentiment' in df:
+        messages = messages[df['sentiment'].loc[messages.index].isna()]
+    else:
+        df['sentiment'] = pd.Series(np.nan, index=df.index, dtype='float32')
+    if len(messages):
+        df.loc[messages.index, 'sentiment'] = score_messages(messages)
+    return df
+
+
+def labels(scores):
+    """'positive' / 'neutral' / 'negative' for each score (NaN stays NaN)."""
+    values = np.select([scores > NEUTRAL_BAND, scores < -NEUTRAL_BAND], ['positive', 'negative'], 'neutral')
+    return pd.Series(values, index=scores.index).where(scores.notna())
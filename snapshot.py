@@ -0,0 +1,126 @@
+"""Columnar snapshots of preprocessed chats.
+
+A snapshot is an uncompressed Arrow IPC (Feather v2) file holding the full
+preprocessed DataFrame, with the low-cardinality columns stored as
+dictionaries, so it can be memory-mapped and reloaded without re-parsing
+the export. A ``.parquet`` path writes a smaller, compressed Parquet file
+instead (read fully rather than memory-mapped).
+
+Convert exports in bulk with:
+    python snapshot.py chats/*.txt --output-dir snapshots/
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+import preprocessor
+
+SNAPSHOT_VERSION = '1'
+SNAPSHOT_SUFFIX = '.arrow'
+
+# Columns stored as categoricals/dictionaries
+CATEGORICAL_COLUMNS = ['user', 'month', 'day_name', 'period']
+
+# Directory where the app stores snapshots keyed by upload hash (disabled when unset)
+SNAPSHOT_DIR = os.environ.get('ECHOMIND_SNAPSHOT_DIR') or None
+
+
+def _to_table(df):
+    df = df.copy(deep=False)
+    for column in CATEGORICAL_COLUMNS:
+        if column in df and df[column].dtype.name != 'category':
+            df[column] = df[column].astype('category')
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[b'echomind_snapshot'] = SNAPSHOT_VERSION.encode()
+    return table.replace_schema_metadata(metadata)
+
+
+def save_snapshot(df, path):
+    """Write a preprocessed chat DataFrame to ``path`` atomically."""
+    table = _to_table(df)
+    tmp_path = path + '.tmp'
+    if path.endswith('.parquet'):
+        pq.write_table(table, tmp_path, compression='zstd')
+    else:
+        feather.write_feather(table, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_snapshot(path, memory_map=True):
+    """Load a snapshot written by save_snapshot back into a DataFrame.
+
+    Raises ValueError when the file was written by an incompatible version.
+    """
+    if path.endswith('.parquet'):
+        table = pq.read_table(path, memory_map=memory_map)
+    else:
+        table = feather.read_table(path, memory_map=memory_map)
+    version = (table.schema.metadata or {}).get(b'echomind_snapshot')
+    if version != SNAPSHOT_VERSION.encode():
+        raise ValueError(f'{path} is not an EchoMind snapshot (version {SNAPSHOT_VERSION})')
+    return table.to_pandas()
+
+
+def snapshot_path(directory, key):
+    return os.path.join(directory, key + SNAPSHOT_SUFFIX)
+
+
+def load_or_parse(source, key, directory=SNAPSHOT_DIR):
+    """Return the chat with content hash ``key``, parsing ``source`` only on a snapshot miss."""
+    if not directory:
+        return preprocessor.preprocess_stream(source)
+
+    path = snapshot_path(directory, key)
+    try:
+        return load_snapshot(path)
+    except (OSError, ValueError, pa.ArrowInvalid):
+        pass
+
+    df = preprocessor.preprocess_stream(source)
+    os.makedirs(directory, exist_ok=True)
+    save_snapshot(df, path)
+    return df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert WhatsApp chat exports to EchoMind snapshots.')
+    parser.add_argument('inputs', nargs='+', help='export .txt files or directories containing them')
+    parser.add_argument('-o', '--output-dir', default='snapshots', help='where snapshots are written')
+    parser.add_argument('--format', choices=['arrow', 'parquet'], default='arrow',
+                        help='arrow (memory-mappable) or parquet (compressed)')
+    args = parser.parse_args(argv)
+
+    paths = []
+    for item in args.inputs:
+        if os.path.isdir(item):
+            paths.extend(sorted(glob.glob(os.path.join(item, '*.txt'))))
+        else:
+            paths.append(item)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    suffix = '.parquet' if args.format == 'parquet' else SNAPSHOT_SUFFIX
+    failed = 0
+    for path in paths:
+        start = time.perf_counter()
+        target = os.path.join(args.output_dir, os.path.splitext(os.path.basename(path))[0] + suffix)
+        try:
+            df = preprocessor.preprocess_file(path)
+            save_snapshot(df, target)
+        except (OSError, UnicodeDecodeError, pa.ArrowException) as e:
+            failed += 1
+            print(f'FAILED {path}: {e}', file=sys.stderr)
+            continue
+        print(f'{path} -> {target} ({len(df):,} messages, {time.perf_counter() - start:.2f}s)')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
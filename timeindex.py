@@ -0,0 +1,93 @@
+"""Date-range and user selection over a chat through a date-sorted row index.
+
+The rows of a chat are ordered by date once, and the rows of each user are
+kept as a contiguous group of that order. A date range (optionally for one
+user) is then two binary searches plus a copy of the k selected row
+positions, O(log n + k), instead of a boolean mask over every message.
+"""
+import weakref
+
+import numpy as np
+import pandas as pd
+
+import helper
+import profiling
+
+
+class TimeIndex:
+    """Row positions of a chat sorted by date, grouped per user."""
+
+    @profiling.timed('timeindex.TimeIndex')
+    def __init__(self, df):
+        dates = df['date'].to_numpy(dtype='datetime64[ns]')
+        # Messages without a date cannot fall in any range
+        dated = np.flatnonzero(~np.isnat(dates))
+        order = dated[np.argsort(dates[dated], kind='stable')]
+        self.order = order
+        self.dates = dates[order].view('int64')
+
+        codes, users = pd.factorize(df['user'].to_numpy()[order])
+        by_user = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[by_user], np.arange(len(users) + 1))
+        self.users = pd.Index(users).astype(str)
+        self._user_order = by_user
+        self._user_dates = self.dates[by_user]
+        self._user_bounds = bounds
+
+    def span(self):
+        """First and last message time (NaT for a chat without dates)."""
+        if not len(self.dates):
+            return pd.NaT, pd.NaT
+        return pd.Timestamp(self.dates[0]), pd.Timestamp(self.dates[-1])
+
+    @staticmethod
+    def _bounds(dates, start, end):
+        lo = 0 if start is None else np.searchsorted(dates, pd.Timestamp(start).value, side='left')
+        hi = len(dates) if end is None else np.searchsorted(dates, pd.Timestamp(end).value, side='left')
+        return lo, max(lo, hi)
+
+    def rows(self, start=None, end=None, selected_user='Overall'):
+        """Positions of the rows dated in [start, end) (of ``selected_user`` only unless 'Overall'), by date."""
+        if selected_user == 'Overall':
+            lo, hi = self._bounds(self.dates, start, end)
+            return self.order[lo:hi]
+        code = self.users.get_indexer([selected_user])[0]
+        if code < 0:
+            return self.order[:0]
+        first, last = self._user_bounds[code], self._user_bounds[code + 1]
+        lo, hi = self._bounds(self._user_dates[first:last], start, end)
+        return self.order[self._user_order[first + lo:first + hi]]
+
+
+# Time indexes are keyed by the identity of their DataFrame, as helper.build_index does
+_indexes = {}
+
+
+def build_time_index(df):
+    key = id(df)
+    entry = _indexes.get(key)
+    if entry is not None and entry[0]() is df:
+        return entry[1]
+
+    index = TimeIndex(df)
+    _indexes[key] = (weakref.ref(df, lambda _, key=key: _indexes.pop(key, None)), index)
+    return index
+
+
+@profiling.timed()
+def select(df, start=None, end=None, selected_user='Overall'):
+    """The rows of ``df`` dated in [start, end), of ``selected_user`` only unless 'Overall'.
+
+    The whole chat is returned as is, so its existing index keeps being used.
+    A subset comes with its helper.ChatIndex already registered, built from
+    the per-message counts of the full chat rather than by re-counting them.
+    """
+    rows = build_time_index(df).rows(start, end, selected_user)
+    if len(rows) == len(df):
+        return df
+    part = df.iloc[rows]
+    if isinstance(part['user'].dtype, pd.CategoricalDtype):
+        part = part.assign(user=part['user'].cat.remove_unused_categories())
+    row_counts = helper.build_index(df).row_counts.iloc[rows]
+    helper.register_index(part, helper.ChatIndex(part, row_counts=row_counts))
+    return part
@@ -0,0 +1,220 @@
+"""Multi-chat workspace: per-chat aggregates kept in a shared store, and cross-chat comparisons.
+
+Every uploaded export is parsed once, in worker processes when several
+arrive together, and reduced to its helper.ChatIndex. Only the index is
+kept, keyed by the content hash of the export, so comparisons between chats
+read stored aggregates and never re-parse a chat.
+"""
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+import cache
+import helper
+import pools
+import profiling
+import snapshot
+
+# Processes used to parse several uploads at once, and chats kept in the store
+WORKSPACE_WORKERS = int(os.environ.get('ECHOMIND_WORKSPACE_WORKERS', str(min(4, os.cpu_count() or 1))))
+STORE_MAX_CHATS = int(os.environ.get('ECHOMIND_STORE_MAX_CHATS', '32'))
+
+# Words used fewer times than this in a chat are not reported as distinctive of it
+MIN_DISTINCTIVE_COUNT = 3
+
+ChatEntry = namedtuple('ChatEntry', ['key', 'name', 'index'])
+
+
+class AggregateStore:
+    """Chat indexes keyed by content hash, shared by every session of the process.
+
+    The least recently used chat is dropped once more than ``max_chats`` are stored.
+    """
+
+    def __init__(self, max_chats=STORE_MAX_CHATS):
+        self.max_chats = max_chats
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, entry):
+        with self._lock:
+            self._entries[entry.key] = entry
+            self._entries.move_to_end(entry.key)
+            while len(self._entries) > self.max_chats:
+                self._entries.popitem(last=False)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+store = AggregateStore()
+
+def summarize_chat(data, key):
+    """Pool task: parse an export and return its index (word and emoji counts included)."""
+    df = snapshot.load_or_parse(BytesIO(data), key)
+    index = helper.ChatIndex(df)
+    index.word_counts, index.emoji_counts
+    return index
+
+
+def display_names(names):
+    """File names made unique by numbering repeats: 'chat.txt', 'chat.txt (2)'."""
+    seen = {}
+    unique = []
+    for name in names:
+        seen[name] = seen.get(name, 0) + 1
+        unique.append(name if seen[name] == 1 else f'{name} ({seen[name]})')
+    return unique
+
+
+@profiling.timed()
+def load_chats(files, loaded=None, workers=None, keys=None):
+    """Make sure every uploaded file is in the store; returns their entries in upload order.
+
+    ``loaded`` maps content keys to DataFrames already parsed by the caller,
+    which are indexed in-process; the other new chats are parsed concurrently.
+    ``keys`` are the content keys of ``files`` when the caller already has
+    them; otherwise every file is hashed.
+    """
+    if workers is None:
+        workers = WORKSPACE_WORKERS
+    loaded = loaded or {}
+    names = display_names([f.name for f in files])
+    if keys is None:
+        keys = [cache.content_key(f) for f in files]
+
+    missing = OrderedDict((key, f) for key, f in zip(keys, files) if key not in store)
+    for key in [key for key in missing if key in loaded]:
+        index = helper.build_index(loaded[key])
+        # The store outlives the caller's frame, which the lazy counts would otherwise need
+        index.word_counts, index.emoji_counts
+        store.put(ChatEntry(key, missing.pop(key).name, index))
+
+    if missing:
+        jobs = [(f.getvalue(), key) for key, f in missing.items()]
+        if workers > 1 and len(jobs) > 1:
+            # Worker processes are shared with the rest of the app (see pools)
+            pool = pools.get_pool(workers)
+            try:
+                futures = [pool.submit(summarize_chat, data, key) for data, key in jobs]
+                indexes = [future.result() for future in futures]
+            except BrokenProcessPool:
+                # A worker died: start a fresh pool next time and parse these in-process
+                pools.reset_pool(pool)
+                indexes = [summarize_chat(data, key) for data, key in jobs]
+        else:
+            indexes = [summarize_chat(data, key) for data, key in jobs]
+        for (key, f), index in zip(missing.items(), indexes):
+            store.put(ChatEntry(key, f.name, index))
+
+    entries = []
+    for key, name in zip(keys, names):
+        entry = store.get(key)
+        if entry is None:
+            # Dropped from a full store while loading the rest; reparse rather than fail
+            entry = ChatEntry(key, name, summarize_chat(files[keys.index(key)].getvalue(), key))
+            store.put(entry)
+        entries.append(entry._replace(name=name))
+    return entries
+
+
+def chat_summary(entries):
+    """Headline figures of each chat, one row per chat."""
+    rows = []
+    for entry in entries:
+        index = entry.index
+        messages, words, media, links = index.stats('Overall')
+        days = index.daily_counts('Overall').index
+        rows.append({
+            'chat': entry.name,
+            'messages': messages,
+            'users': int((index.user_counts.index != 'group_notification').sum()),
+            'words': words,
+            'media': media,
+            'links': links,
+            'first_day': days.min() if len(days) else pd.NaT,
+            'last_day': days.max() if len(days) else pd.NaT,
+        })
+    return pd.DataFrame(rows).set_index('chat')
+
+
+def compare_timelines(entries, freq='monthly'):
+    """Messages per month (or per day with freq='daily') of every chat, one column per chat."""
+    columns = {}
+    for entry in entries:
+        if freq == 'daily':
+            counts = entry.index.daily_counts('Overall')
+            dates = pd.DatetimeIndex(counts.index.get_level_values('only_date'))
+        else:
+            counts = entry.index.monthly_counts('Overall')
+            dates = pd.to_datetime(pd.DataFrame({'year': counts.index.get_level_values('year'),
+                                                 'month': counts.index.get_level_values('month_num'),
+                                                 'day': 1}))
+        # set_axis copies: the stored index tables must stay untouched
+        columns[entry.name] = counts.set_axis(dates)
+    timeline = pd.DataFrame(columns).sort_index().fillna(0).astype('int64')
+    return timeline.rename_axis('date')
+
+
+def user_overlap(entries):
+    """Messages of each user found in more than one chat, and the number of users each pair of chats shares."""
+    counts = pd.DataFrame({entry.name: entry.index.user_counts for entry in entries})
+    counts = counts.drop(index='group_notification', errors='ignore').fillna(0).astype('int64')
+    counts.index = counts.index.astype(str)
+    present = counts > 0
+    shared_users = counts[present.sum(axis=1) > 1]
+    shared_users = shared_users.loc[shared_users.sum(axis=1).sort_values(ascending=False).index]
+    presence = present.to_numpy(dtype=np.int64)
+    shared_counts = pd.DataFrame(presence.T @ presence, index=counts.columns, columns=counts.columns)
+    return shared_users.rename_axis('user'), shared_counts
+
+
+def distinctive_terms(entries, kind='words', top=15, min_count=MIN_DISTINCTIVE_COUNT):
+    """Words (or emojis with kind='emojis') each chat uses far more than the others.
+
+    Terms are ranked by the log ratio of their smoothed frequency in the chat
+    to their frequency in all other chats together. Returns one column of
+    terms per chat.
+    """
+    counts = {entry.name: entry.index.words('Overall') if kind == 'words' else entry.index.emojis('Overall')
+              for entry in entries}
+    table = pd.DataFrame({name: pd.Series(terms, dtype='float64') for name, terms in counts.items()}).fillna(0)
+    if kind == 'words':
+        # Emoji runs and punctuation are tokens too; keep the ones containing a letter
+        table = table[table.index.str.contains(r'[^\W\d_]', regex=True)]
+    if table.empty:
+        return pd.DataFrame(columns=[entry.name for entry in entries])
+    totals = table.sum()
+    vocabulary = len(table)
+    rest = table.sum(axis=1).to_numpy()[:, None] - table.to_numpy()
+    rest_totals = totals.sum() - totals.to_numpy()
+    ratio = (np.log((table.to_numpy() + 1) / (totals.to_numpy() + vocabulary))
+             - np.log((rest + 1) / (rest_totals + vocabulary)))
+    scores = pd.DataFrame(ratio, index=table.index, columns=table.columns).where(table >= min_count)
+
+    columns = {}
+    for name in scores.columns:
+        best = scores[name].dropna().nlargest(top)
+        columns[name] = pd.Series(best.index, dtype=object)
+    return pd.DataFrame(columns)